@@ -0,0 +1,186 @@
+"""
+Times `loco_updater.update_android_strings` against the merge it replaced on synthetic strings.xml files of every locale.
+
+Each locale gets `--keys` keys, a tenth of them being plurals, and an export that updates a fifth of them, removes a
+twentieth and adds as many new ones, which is close to what a busy day on Loco looks like. The baseline removes and
+inserts the tags one by one, sorts them, then indents the tree in three passes and writes it with ElementTree like ink
+did before. Run it from ink's folder with the loco_validator submodule checked out:
+
+    python benchmarks/bench_update_android_strings.py --keys 1000 5000 10000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import loco_updater as lu
+
+
+def build_root(key_count, value_prefix, skipped_every=None, added_count=0):
+    root = ET.Element("resources")
+    for index in range(key_count):
+        if skipped_every and index % skipped_every == 0:
+            continue
+        _add_key(root, f"key{index:06d}", index, value_prefix)
+
+    for index in range(added_count):
+        _add_key(root, f"addedKey{index:06d}", index, value_prefix)
+
+    return root
+
+
+def _add_key(root, name, index, value_prefix):
+    if index % 10 == 0:
+        plurals = ET.SubElement(root, "plurals", name=name)
+        for quantity in ("one", "other"):
+            item = ET.SubElement(plurals, "item", quantity=quantity)
+            item.text = f"{value_prefix} %d {quantity} {index}"
+    else:
+        string = ET.SubElement(root, "string", name=name)
+        string.text = f"{value_prefix} text number {index} with a %1$s placeholder"
+
+
+def build_export_root(key_count):
+    export = build_root(key_count, "Old", skipped_every=20, added_count=key_count // 20)
+    for index, elem in enumerate(export):
+        if index % 5 == 0:
+            for text_holder in (elem if elem.tag == "plurals" else [elem]):
+                text_holder.text = text_holder.text.replace("Old", "New")
+    return export
+
+
+def baseline_update_android_strings(root_current, root_new, selected_keys, output_xml_path, header=None):
+    """The merge and formatting of strings.xml files as they were before `_merge_elements` and the single pass serializer"""
+    lu.register_android_xml_namespaces()
+    saved_attributes = lu._extract_xml_attributes(root_current)
+    selected_keys_set = set(selected_keys)
+
+    _remove_selected_keys(root_current, selected_keys_set)
+    _insert_new_keys(root_new, root_current, selected_keys_set)
+    _sort_and_reorganize_elements(root_current)
+
+    lu._apply_xml_attributes(root_current, saved_attributes)
+
+    _baseline_indent(root_current)
+    ET.ElementTree(root_current).write(output_xml_path, encoding="utf-8")
+
+    # The closing tag and the header used to be fixed in the written file
+    path = Path(output_xml_path)
+    text = path.read_text()
+    if text.endswith("    </resources>"):
+        text = text[:-len("    </resources>")] + "</resources>"
+    if header is not None:
+        text = header + "\n" + text
+    path.write_text(text)
+
+
+def _remove_selected_keys(root_current, selected_tags_set):
+    for elem in list(root_current):
+        name = elem.get('name')
+        if (len(selected_tags_set) == 0 and name not in lu.ignored_ids) or name in selected_tags_set:
+            root_current.remove(elem)
+
+
+def _insert_new_keys(root_new, root_current, selected_tags_set):
+    for elem in root_new:
+        name = elem.get('name')
+        if len(selected_tags_set) == 0 or name in selected_tags_set:
+            root_current.append(elem)
+
+
+def _sort_and_reorganize_elements(root_current):
+    non_translatable_elems = [e for e in root_current if e.get('translatable') == 'false']
+    translatable_elems = [e for e in root_current if e.get('translatable') != 'false']
+    translatable_elems.sort(key=lambda e: e.get('name') or "")
+    root_current[:] = non_translatable_elems + translatable_elems
+
+
+def _baseline_indent(root_elem):
+    element_names_with_blank_after = {
+        elem.get('name') for elem in root_elem if elem.get('name') and '\n\n' in (elem.tail or '')
+    }
+    has_leading_blank_line = (root_elem.text or '').count('\n') > 1
+    _apply_standard_indent(root_elem)
+    _apply_blank_lines(root_elem, element_names_with_blank_after, has_leading_blank_line)
+
+
+def _apply_standard_indent(root_elem, level=0):
+    i = "\n" + level * "    "
+
+    if len(root_elem):
+        if not root_elem.text or not root_elem.text.strip():
+            root_elem.text = i + "    "
+
+        for elem in root_elem:
+            _apply_standard_indent(elem, level + 1)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+
+    if level and (not root_elem.tail or not root_elem.tail.strip()):
+        root_elem.tail = i
+
+
+def _apply_blank_lines(root, element_names_with_blank_after, has_leading_blank_line, level=0):
+    indent_str = (level + 1) * "    "
+
+    if level == 0 and has_leading_blank_line:
+        current_text = root.text or ''
+        if not current_text.endswith('\n\n'):
+            root.text = current_text.rstrip() + '\n\n' + "    "
+
+    for elem in root:
+        name = elem.get('name')
+        if name and name in element_names_with_blank_after:
+            current_tail = elem.tail or ''
+            if not current_tail.endswith('\n\n'):
+                elem.tail = current_tail.rstrip() + '\n\n' + indent_str
+
+        if len(elem) > 0:
+            _apply_blank_lines(elem, element_names_with_blank_after, False, level + 1)
+
+
+def run(update, key_count, repeat, selected_key_count):
+    """Returns the time `update` took to merge every locale, on each repeat"""
+    selected_keys = [f"key{index:06d}" for index in range(0, selected_key_count * 7, 7)]
+
+    timings = []
+    with tempfile.TemporaryDirectory() as output_folder:
+        for _ in range(repeat):
+            # Both trees are built again as the merge moves the exported tags into the current tree and indents them
+            current_roots = {value_folder: build_root(key_count, "Old") for value_folder in lu.value_folders}
+            export_roots = {value_folder: build_export_root(key_count) for value_folder in lu.value_folders}
+
+            start = time.perf_counter()
+            for value_folder in lu.value_folders:
+                update(current_roots[value_folder], export_roots[value_folder], selected_keys,
+                       f"{output_folder}/{value_folder}.xml", header="<!-- header -->")
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, nargs="+", default=[1000, 5000, 10000],
+                        help="numbers of keys of each locale to time the merges with")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs, the best one is reported")
+    parser.add_argument("--selected-keys", type=int, default=0,
+                        help="number of keys to import as target ids, all of them are imported when 0")
+    args = parser.parse_args()
+
+    print(f"{len(lu.value_folders)} locales, {args.selected_keys or 'all'} selected keys, best of {args.repeat} runs")
+    print(f"{'keys':>8} {'baseline':>12} {'current':>12} {'speedup':>8}")
+    for key_count in args.keys:
+        baseline = min(run(baseline_update_android_strings, key_count, args.repeat, args.selected_keys))
+        current = min(run(lu.update_android_strings, key_count, args.repeat, args.selected_keys))
+        print(f"{key_count:>8} {baseline * 1000:>9.1f} ms {current * 1000:>9.1f} ms {baseline / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
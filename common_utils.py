@@ -2,28 +2,34 @@ import importlib.util
 import os
 import random
 
-import inquirer
-from inquirer.themes import Default as DefaultTheme
-
 ink_folder = os.path.abspath(os.path.dirname(__file__))
 
 # Custom overridable theme
 CUSTOM_CLASS_FILE = ink_folder + "/inquirer_theme.py"
 CLASS_NAME = "InkTheme"
-CurrentInkTheme = DefaultTheme
 
-if os.path.isfile(CUSTOM_CLASS_FILE):
-    spec = importlib.util.spec_from_file_location("inquirer_theme", CUSTOM_CLASS_FILE)
-    custom_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(custom_module)
+_current_ink_theme = None
 
-    # Check if the user defined the class
-    if hasattr(custom_module, CLASS_NAME):
-        CurrentInkTheme = getattr(custom_module, CLASS_NAME)
-    else:
-        pass
-else:
-    pass
+
+def get_current_ink_theme():
+    """Loads the theme on the first prompt since inquirer takes longer to import than most commands take to run"""
+    global _current_ink_theme
+    if _current_ink_theme is not None:
+        return _current_ink_theme
+
+    from inquirer.themes import Default as DefaultTheme
+    _current_ink_theme = DefaultTheme
+
+    if os.path.isfile(CUSTOM_CLASS_FILE):
+        spec = importlib.util.spec_from_file_location("inquirer_theme", CUSTOM_CLASS_FILE)
+        custom_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(custom_module)
+
+        # Check if the user defined the class
+        if hasattr(custom_module, CLASS_NAME):
+            _current_ink_theme = getattr(custom_module, CLASS_NAME)
+
+    return _current_ink_theme
 
 
 def remove_empty_items(array):
@@ -33,7 +39,8 @@ def remove_empty_items(array):
 def select_in_list(message, choices):
     if len(choices) == 1:
         return choices[0]
-    return inquirer.prompt([inquirer.List('choice', message=message, choices=choices)], theme=CurrentInkTheme())['choice']
+    import inquirer
+    return inquirer.prompt([inquirer.List('choice', message=message, choices=choices)], theme=get_current_ink_theme()())['choice']
 
 
 def accept_substitution(input):
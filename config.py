@@ -1,13 +1,16 @@
 import os
+import pickle
+import tempfile
+from functools import lru_cache
 from pathlib import Path
 
-import yaml
-
 script_folder = os.path.dirname(__file__)
 config_filename = "settings.yml"
 current_project_filename = ".current_project"
 config_file = script_folder + '/' + config_filename
 current_project_file = script_folder + '/' + current_project_filename
+# Parsed settings, reused until the settings file changes since parsing YAML takes longer than most commands take to run
+settings_cache_file = script_folder + "/settings_cache"
 missing_config_file = True
 
 project_key = None
@@ -34,6 +37,7 @@ def get_project_module_parent(root_key=project_key):
     return Path(manually_get_project(root_key, "global", "project_root")) / ".."
 
 
+@lru_cache(maxsize=None)
 def _get(root_key, section, key, raise_error):
     ensure_settings_exist()
 
@@ -66,11 +70,48 @@ def ensure_settings_exist():
         exit(1)
 
 
+def load_settings():
+    """Returns the parsed settings, from the cache when the size and modification time of the settings file didn't change"""
+    stat = os.stat(config_file)
+    settings_version = (stat.st_mtime_ns, stat.st_size)
+
+    try:
+        with open(settings_cache_file, "rb") as f:
+            cached_version, cached_settings = pickle.load(f)
+        if cached_version == settings_version:
+            return cached_settings
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError, AttributeError):
+        pass  # Missing or corrupt, the settings are parsed again and cached anew
+
+    import yaml
+
+    with open(config_file) as f:
+        settings = yaml.safe_load(f)
+
+    _write_settings_cache(settings_version, settings)
+    return settings
+
+
+def _write_settings_cache(settings_version, settings):
+    # Written to a temporary file first so concurrent ink invocations never read a partially written cache
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=script_folder)
+    except OSError:
+        return  # The settings are simply parsed again next time
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((settings_version, settings), f)
+        os.replace(tmp_path, settings_cache_file)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        # The cache is only an optimization, failing to write it must not fail the command
+        os.remove(tmp_path)
+
+
 if os.path.exists(config_file):
     missing_config_file = False
 
-    with open(config_file) as f:
-        config = yaml.safe_load(f)
+    config = load_settings()
 
     if os.path.exists(current_project_file):
         with open(current_project_file) as f:
@@ -0,0 +1,236 @@
+"""
+Persistent cache of the archives exported by Loco and of the strings that passed validation.
+
+Archives are stored per export url (so per Loco project and per tag) inside ink's folder and are revalidated with HTTP
+conditional requests. When the server does not honor them, the content hash of the archive is used instead to know if the
+export changed since it was last imported into a project.
+
+Strings that passed validation are remembered per project with the hash of their value, so checking a project only
+validates again the strings that changed since its last check.
+
+The ids of the assets of each Loco project are indexed so checking if a key exists doesn't need a request per key.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zipfile
+
+import config
+
+cache_folder = config.script_folder + "/loco_cache"
+applied_exports_folder = cache_folder + "/applied"
+validations_folder = cache_folder + "/validations"
+asset_indexes_folder = cache_folder + "/assets"
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_atomically(path, write):
+    """Writes to a temporary file first so concurrent ink invocations never read a partially written file"""
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class LocoArchiveCache:
+    def __init__(self, url):
+        # The url contains the api key so only its hash is written to the disk
+        self.folder = f"{cache_folder}/{_hash(url)[:16]}"
+        self.archive_path = self.folder + "/archive.zip"
+        self.metadata_path = self.folder + "/metadata.json"
+        self.metadata = _read_json(self.metadata_path) or {}
+
+        if not os.path.exists(self.archive_path):
+            self.metadata = {}
+
+    @property
+    def content_hash(self):
+        return self.metadata.get("content_hash")
+
+    def conditional_headers(self):
+        headers = {}
+        if self.metadata.get("etag"):
+            headers["If-None-Match"] = self.metadata["etag"]
+        if self.metadata.get("last_modified"):
+            headers["If-Modified-Since"] = self.metadata["last_modified"]
+        return headers
+
+    def store(self, response, chunk_size):
+        """Streams the body of a successful response into the cache and updates the validators of the entry"""
+
+        def write_chunks(f):
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+        _write_atomically(self.archive_path, write_chunks)
+
+        self.metadata = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": compute_archive_content_hash(self.archive_path),
+        }
+        _write_atomically(self.metadata_path, lambda f: f.write(json.dumps(self.metadata).encode("utf-8")))
+
+
+def compute_archive_content_hash(archive_path):
+    """
+    Hashes the content of the files inside the archive rather than the archive itself because Loco generates a new zip, with
+    new timestamps, for each export even when no string changed.
+    """
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        # The top level folder is skipped because its name is generated by Loco
+        members = sorted((info.filename.partition("/")[2], info.CRC, info.file_size) for info in zip_ref.infolist())
+    return _hash(repr(members))
+
+
+def _get_applied_export_path(target_folder):
+    return f"{applied_exports_folder}/{_hash(os.path.abspath(target_folder))[:16]}.json"
+
+
+def _get_files_signature(file_paths):
+    # Switching git branch or manually editing a file changes its stat so the export has to be applied again
+    signature = {}
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            signature[file_path] = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            signature[file_path] = None
+    return signature
+
+
+def is_export_already_applied(target_folder, export_fingerprint, file_paths):
+    applied_export = _read_json(_get_applied_export_path(target_folder))
+    if applied_export is None:
+        return False
+
+    return applied_export.get("fingerprint") == export_fingerprint and applied_export.get("files") == _get_files_signature(
+        file_paths)
+
+
+def mark_export_as_applied(target_folder, export_fingerprint, file_paths):
+    applied_export = {
+        "fingerprint": export_fingerprint,
+        "files": _get_files_signature(file_paths),
+    }
+    _write_atomically(_get_applied_export_path(target_folder), lambda f: f.write(json.dumps(applied_export).encode("utf-8")))
+
+
+class ValidationCache:
+    """
+    Remembers the strings of a project that passed validation, per locale, along with the translations of the keys that
+    passed the checks across locales. Everything is forgotten as soon as the validator changes.
+    """
+
+    def __init__(self, target_folder, validator_version):
+        self.path = f"{validations_folder}/{_hash(os.path.abspath(target_folder))[:16]}.json"
+        self.validator_version = validator_version
+
+        cache = _read_json(self.path) or {}
+        is_up_to_date = cache.get("validator_version") == validator_version
+        self.valid_strings = cache.get("strings", {}) if is_up_to_date else {}
+        self.valid_keys = cache.get("keys", {}) if is_up_to_date else {}
+
+    def is_string_valid(self, language, name, value):
+        return self.valid_strings.get(language, {}).get(name) == hash_value(value)
+
+    def is_key_valid(self, name, translations):
+        return self.valid_keys.get(name) == hash_translations(translations)
+
+    def save(self, valid_strings, valid_keys):
+        """
+        Replaces the content of the cache so strings and keys removed from the project are forgotten
+
+        :param valid_strings: Values of the strings that passed validation, per locale then per name
+        :param valid_keys: Translations per locale of the keys that passed the checks across locales, per name
+        """
+        cache = {
+            "validator_version": self.validator_version,
+            "strings": {
+                language: {name: hash_value(value) for name, value in strings.items()}
+                for language, strings in valid_strings.items()
+            },
+            "keys": {name: hash_translations(translations) for name, translations in valid_keys.items()},
+        }
+        _write_atomically(self.path, lambda f: f.write(json.dumps(cache).encode("utf-8")))
+
+
+def hash_value(value):
+    # None and the empty string are different values for the validator
+    return _hash(repr(value))[:16]
+
+
+def hash_translations(translations):
+    return _hash(repr(sorted(translations.items())))[:16]
+
+
+def compute_package_version(package_folder):
+    """
+    Hashes every file of the package, so editing any of its modules or rules changes the version, whether it's a submodule
+    at another commit or a local change
+    """
+    package_hash = hashlib.sha256()
+    for folder, sub_folders, file_names in os.walk(package_folder):
+        sub_folders[:] = sorted(name for name in sub_folders if name not in (".git", "__pycache__"))
+        for file_name in sorted(file_names):
+            if file_name.endswith(".pyc"):
+                continue
+
+            file_path = os.path.join(folder, file_name)
+            package_hash.update(os.path.relpath(file_path, package_folder).encode("utf-8") + b"\0")
+            with open(file_path, "rb") as f:
+                package_hash.update(hashlib.sha256(f.read()).digest())
+
+    return package_hash.hexdigest()[:16]
+
+
+class LocoAssetIndex:
+    """
+    Ids of the assets of a Loco project, as listed by Loco at `listed_at` and completed with the keys uploaded since then.
+    """
+
+    def __init__(self, loco_api_key):
+        # Only the hash of the api key is written to the disk
+        self.path = f"{asset_indexes_folder}/{_hash(loco_api_key)[:16]}.json"
+
+        index = _read_json(self.path) or {}
+        self.listed_at = index.get("listed_at", 0)
+        self.asset_ids = set(index.get("asset_ids", []))
+
+    def is_older_than(self, max_age):
+        return time.time() - self.listed_at > max_age
+
+    def replace(self, asset_ids):
+        """Replaces the index with a complete listing of the assets of the project"""
+        self.listed_at = time.time()
+        self.asset_ids = set(asset_ids)
+        self._save()
+
+    def add(self, asset_ids):
+        """Adds assets created since the last listing, without changing its age"""
+        self.asset_ids.update(asset_ids)
+        self._save()
+
+    def _save(self):
+        index = {"listed_at": self.listed_at, "asset_ids": sorted(self.asset_ids)}
+        _write_atomically(self.path, lambda f: f.write(json.dumps(index).encode("utf-8")))
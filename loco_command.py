@@ -0,0 +1,299 @@
+"""Top-level orchestration for the `ink loco` and `ink lococore` commands."""
+import argparse
+import io
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout, redirect_stderr
+
+import config
+import loco_updater as lu
+from print_utils import color, Colors
+
+
+class LocoImportError(Exception):
+    pass
+
+
+def update_loco(args):
+    def build_loco_update_strategy(project):
+        project_root = config.manually_get_project(project, "global", "project_root")
+        res_folder_path = "/src/main/res"
+        module = get_module_or_default(args, "")
+
+        return lu.LocoUpdateStrategy(
+            # If only checking strings validity, no need to raise an error for a missing loco api key
+            api_key=config.manually_get_project(project, "loco", "loco_key", raise_error=not args.check),
+            copy_target_folder=project_root + module + res_folder_path,
+            git_project_root=project_root,
+        )
+
+    import_strings_of_projects(args, build_loco_update_strategy)
+
+
+def update_loco_core(args):
+    def build_loco_update_strategy(project):
+        project_root = config.manually_get_project(project, "global", "project_root")
+        res_folder_path = "/src/main/res"
+        module = get_module_or_default(args, "/../Core/Common")
+
+        return lu.LocoUpdateStrategy(
+            # If only checking strings validity, no need to raise an error for a missing loco api key
+            api_key=config.get_global("loco", "core_key", raise_error=not args.check),
+            copy_target_folder=project_root + module + res_folder_path,
+            git_project_root=project_root + "/../Core",
+        )
+
+    import_strings_of_projects(args, build_loco_update_strategy)
+
+
+def import_strings_of_projects(args, build_loco_update_strategy):
+    if args.watch and (args.diff or args.check or args.jobs > 1):
+        # Each poll only imports the keys that changed, one project after the other
+        print("--watch can't be combined with --diff, --check or --jobs")
+        exit(1)
+
+    project_keys = args.projects if args.projects else [config.project_key]
+    loco_update_strategies = select_projects_with_distinct_strings_folder(
+        {project: build_loco_update_strategy(project) for project in project_keys})
+
+    if args.watch:
+        watch_strings_of_projects(args, loco_update_strategies)
+        return
+
+    # Projects sharing a loco key, like every project of `lococore`, import the same export which is only downloaded once
+    needs_download = args.diff or not args.check
+    loco_exports = download_shared_exports(args, loco_update_strategies) if needs_download else {}
+
+    if args.jobs > 1 and len(loco_update_strategies) > 1:
+        failed_projects = import_strings_of_projects_in_parallel(args, loco_update_strategies, loco_exports)
+    else:
+        failed_projects = []
+        for project, loco_update_strategy in loco_update_strategies.items():
+            if len(project_keys) > 1:
+                print(f"\n* Processing project {project}")
+
+            try:
+                import_strings(args, loco_update_strategy, args.tag, loco_export=loco_exports.get(project))
+            except LocoImportError as _:
+                failed_projects.append(project)
+
+    if failed_projects:
+        if len(project_keys) > 1:
+            print(f"\nFailed projects: {', '.join(failed_projects)}")
+        exit(1)
+
+
+def select_projects_with_distinct_strings_folder(loco_update_strategies):
+    """
+    Several projects can point at the same strings folder, like apps embedding the same Core checkout. Importing into it
+    more than once would only repeat the same writes, so only the first project of each folder is kept.
+    """
+    selected_strategies = {}
+    project_per_folder = {}
+
+    for project, loco_update_strategy in loco_update_strategies.items():
+        strings_folder = os.path.realpath(loco_update_strategy.copy_target_folder)
+        if strings_folder in project_per_folder:
+            print(f"Skipping project {project}, its strings are already imported by project {project_per_folder[strings_folder]}")
+            continue
+
+        project_per_folder[strings_folder] = project
+        selected_strategies[project] = loco_update_strategy
+
+    return selected_strategies
+
+
+def download_shared_exports(args, loco_update_strategies):
+    """
+    Downloads once the export of each loco key used by several projects and returns it for each of these projects. Exports of
+    a single project are left to `import_strings` so they are downloaded along with the rest of its output.
+    """
+    projects_per_key = {}
+    for project, loco_update_strategy in loco_update_strategies.items():
+        projects_per_key.setdefault(loco_update_strategy.api_key, []).append(project)
+
+    loco_exports = {}
+    for projects in projects_per_key.values():
+        if len(projects) < 2:
+            continue
+
+        print(f"\n* Downloading strings of projects {', '.join(projects)}")
+        loco_export = lu.download_strings(loco_update_strategies[projects[0]], args.tag)
+        if loco_export is None:
+            continue  # Each project reports the failure when trying again on its own
+
+        for project in projects:
+            loco_exports[project] = loco_export
+
+    return loco_exports
+
+
+def import_strings_of_projects_in_parallel(args, loco_update_strategies, loco_exports):
+    for loco_update_strategy in loco_update_strategies.values():
+        # Projects are already spread over the cpus, starting worker processes per locale too would oversubscribe them
+        loco_update_strategy.locale_jobs = 1
+    # The command callback is not needed by the workers, only the parsed options are
+    worker_args = argparse.Namespace(**{key: value for key, value in vars(args).items() if key != "func"})
+    project_keys = list(loco_update_strategies)
+
+    failed_projects = []
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(project_keys))) as executor:
+        futures = [
+            executor.submit(import_project_strings_in_worker, worker_args, loco_update_strategies[project],
+                            loco_exports.get(project))
+            for project in project_keys
+        ]
+
+        # Outputs are printed in the order of the projects so logs stay stable from one run to the other
+        for project, future in zip(project_keys, futures):
+            try:
+                output, is_success = future.result()
+            except Exception as _:  # The worker itself failed, like when its process died, the other projects still matter
+                output, is_success = traceback.format_exc(), False
+            print(f"\n* Processing project {project}")
+            print(output, end="")
+            if not is_success:
+                failed_projects.append(project)
+
+    print("\nSummary")
+    for project in project_keys:
+        status = color("failed", Colors.red) if project in failed_projects else color("passed", Colors.green)
+        print(f"  {project}: {status}")
+
+    return failed_projects
+
+
+def import_project_strings_in_worker(args, loco_update_strategy, loco_export=None):
+    """
+    Runs `import_strings` inside a worker process. The output is buffered so it can be printed grouped per project by the
+    parent process instead of interleaving with the output of the other workers.
+    """
+    output = io.StringIO()
+    is_success = True
+
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            import_strings(args, loco_update_strategy, args.tag, loco_export=loco_export)
+        except LocoImportError as _:
+            is_success = False
+        except SystemExit as exit_exception:  # Missing settings and other fatal errors call exit() from inside the import
+            is_success = exit_exception.code in (None, 0)
+        except Exception as _:  # Unexpected errors are shown with the output of their project rather than aborting the others
+            traceback.print_exc()
+            is_success = False
+
+    return output.getvalue(), is_success
+
+
+def watch_strings_of_projects(args, loco_update_strategies):
+    """Polls Loco until interrupted and imports the keys that changed into each project as soon as they are exported"""
+    applied_fingerprints = {}
+
+    print(f"Watching Loco every {args.interval} seconds, press Ctrl+C to stop")
+    while True:
+        loco_exports = {}  # Each loco key is only polled once even if several projects use it
+        for project, loco_update_strategy in loco_update_strategies.items():
+            try:
+                applied_fingerprints[project] = import_changed_strings(
+                    args, loco_update_strategy, applied_fingerprints.get(project),
+                    project if len(loco_update_strategies) > 1 else None, loco_exports)
+            except LocoImportError as _:
+                pass  # The error has already been printed, the next poll will try again
+
+        sys.stdout.flush()  # Shows imports right away when the output is redirected to a log file
+        time.sleep(args.interval)
+
+
+def import_changed_strings(args, loco_update_strategy, applied_fingerprint, project, loco_exports):
+    """
+    Imports only the keys that differ between the project and the export, and returns the fingerprint of the export so it's
+    not compared to the project again until it changes. Unchanged exports are answered by Loco with a 304, so polls are cheap.
+    """
+    loco_export = loco_exports.get(loco_update_strategy.api_key)
+    if loco_export is None:
+        loco_export = lu.download_strings(loco_update_strategy, args.tag, quiet=True)
+        if loco_export is None:
+            raise LocoImportError("Failed to download strings")
+        loco_exports[loco_update_strategy.api_key] = loco_export
+
+    if loco_export.fingerprint == applied_fingerprint:
+        return applied_fingerprint
+
+    changed_keys = lu.get_changed_keys(loco_update_strategy, loco_export)
+    if changed_keys:
+        project_label = f" in project {project}" if project else ""
+        accord = "s" if len(changed_keys) > 1 else ""
+        print(f"\n[{time.strftime('%H:%M:%S')}] {len(changed_keys)} key{accord} changed on Loco{project_label}")
+
+        # Importing the changed keys as target ids only rewrites them, and the validation cache limits the check to them
+        delta_args = argparse.Namespace(**{**vars(args), "target_ids": changed_keys})
+        import_strings(delta_args, loco_update_strategy, args.tag, loco_export=loco_export)
+
+    return loco_export.fingerprint
+
+
+def get_module_or_default(args, default):
+    return default if args.module is None else "/../" + args.module
+
+
+def import_strings(args, loco_update_strategy, feature_tag, loco_export=None):
+    def download_resources():
+        loco_export = lu.download_strings(loco_update_strategy, feature_tag)
+        if loco_export is None:
+            raise LocoImportError("Failed to download strings")
+
+        return loco_export
+
+    def update_resources(loco_export):
+        # Each poll of a watch only imports the keys that changed since the previous one, so previous imports must be kept
+        return lu.update_loco(args.target_ids, loco_update_strategy, loco_export, force=args.force,
+                              keep_local_changes=args.watch)
+
+    def compute_diffs(project_strings, loco_export):
+        lu.compute_project_diffs(loco_update_strategy, loco_export, project_strings, list_keys=args.list_keys)
+        print()
+
+    def check_resources(project_strings):
+        print("\nSearching for errors in imported strings")
+        error_count = lu.validate_strings(project_strings, loco_update_strategy, force=args.force)
+        if error_count == 0:
+            print("Found no error")
+        else:
+            accord = "s" if error_count > 1 else ""
+            print(f"\nFound {error_count} error{accord}")
+            if args.verbose:
+                print("\n[verbose]")
+                print("To fix this issue:")
+                print("  • Correct the strings and re-import translations into the project.")
+                print("  • If this is a false positive, add the string ID as an exception in loco_validator/validator.py, "
+                      "then confirm with the project maintainers.")
+            raise LocoImportError("Found errors in imported strings")
+
+    # Determine what operations we need
+    is_default_case = not args.diff and not args.check  # The default case with no args
+    is_tag_provided = args.target_ids is not None and len(args.target_ids) > 0
+
+    needs_download = is_default_case or args.diff
+    needs_update = is_default_case
+    needs_check = is_default_case or args.check
+    needs_diff = (is_default_case and is_tag_provided) or args.diff
+
+    # Project strings are parsed once and shared by every step, the update returns them as they are after the import
+    project_strings = None
+
+    if needs_download:
+        if loco_export is None:  # Not already downloaded by the caller
+            loco_export = download_resources()
+        if needs_update:
+            project_strings = update_resources(loco_export)
+        if needs_diff:
+            # Without a previous update, project strings are left unparsed so the diff can stream them
+            compute_diffs(project_strings, loco_export)
+
+    if needs_check:
+        if project_strings is None:
+            project_strings = lu.read_project_strings(loco_update_strategy)
+        check_resources(project_strings)
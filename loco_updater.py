@@ -1,10 +1,12 @@
-import copy
+import hashlib
+import io
 import os
-import shutil
 import subprocess
 import xml.etree.ElementTree as ET
 import zipfile
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
 
@@ -13,10 +15,10 @@ import requests
 import config as config
 import loco_validator.validator as loco_validator
 from file_manipulations_utils import insert_after_line_or_warn, find_closest_parent_git_directory, insert_before_line_or_warn
+from loco_cache import LocoArchiveCache, ValidationCache, compute_package_version, is_export_already_applied, mark_export_as_applied
 from print_utils import color, Colors
-from utils.android_xml_formatter import indent_android_strings_xml
+from utils.android_xml_formatter import write_android_strings_xml
 
-loco_tmp_dir = "/tmp/ink_archive"
 value_folders = ['values',
                  'values-de',
                  'values-es',
@@ -33,6 +35,13 @@ value_folders = ['values',
 
 project_root = config.get_project("global", "project_root")
 
+download_chunk_size = 64 * 1024
+download_timeout = 60  # Seconds without receiving any byte before giving up
+_http_session = None
+
+# Below this amount of bytes, starting worker processes costs more than the xml work they would do in parallel
+min_work_size_for_locale_pool = 512 * 1024
+
 ignored_ids = {
     "appName",  # All apps
     "notification_channel_id_draft_service",  # kMail
@@ -45,108 +54,212 @@ ignored_ids = {
 
 
 class LocoUpdateStrategy:
-    def __init__(self, api_key, copy_target_folder, git_project_root):
+    def __init__(self, api_key, copy_target_folder, git_project_root, locale_jobs=os.cpu_count() or 1):
         self.api_key = api_key
         self.copy_target_folder = copy_target_folder
         self.git_project_root = git_project_root
+        # Maximum amount of worker processes used to handle the value folders of the project at the same time
+        self.locale_jobs = locale_jobs
+
+
+def run_per_locale(function, tasks, locale_jobs, work_size):
+    """
+    Calls `function` on each task, in worker processes when there is enough work to be worth it. Results are returned in the
+    order of the tasks whatever the order in which workers finish, so printed output stays stable.
+
+    :param work_size: Approximation of the amount of bytes of xml to process, to decide if worker processes are worth it
+    """
+    if locale_jobs > 1 and len(tasks) > 1 and work_size >= min_work_size_for_locale_pool:
+        with ProcessPoolExecutor(max_workers=min(locale_jobs, len(tasks))) as executor:
+            return list(executor.map(function, tasks))
+
+    return [function(task) for task in tasks]
+
+
+def run_capturing_output(function, *args):
+    """Returns the result of the function along with what it printed, so workers' output can be printed in order"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = function(*args)
+    return result, output.getvalue()
 
 
-def download_strings(loco_update_strategy, input_feature_tag):
+def get_files_size(file_paths):
+    return sum(os.path.getsize(file_path) for file_path in file_paths if os.path.exists(file_path))
+
+
+def download_strings(loco_update_strategy, input_feature_tag, quiet=False):
     loco_key = loco_update_strategy.api_key
     tag = input_feature_tag or config.get_project("loco", "tag", raise_error=False)
     is_tag_provided = tag is not None
 
-    # Remove ink's tmp folder if it exists because the rest of the code relies on no other files being present
-    if os.path.exists(loco_tmp_dir):
-        shutil.rmtree(loco_tmp_dir)
-
-    android_archive_name = "android.zip"
     android_tag = tag if is_tag_provided and tag.startswith("android-") else "android,!android-*"
-    android_archive_path = download_zip(tag=android_tag, loco_key=loco_key, archive_name=android_archive_name)
-    if android_archive_path is None:
+    archive_tags = [android_tag, tag] if is_tag_provided else [android_tag]
+
+    # Both archives are independent so they are fetched at the same time over the shared session
+    with ThreadPoolExecutor(max_workers=len(archive_tags)) as executor:
+        archives = list(executor.map(lambda archive_tag: download_zip(tag=archive_tag, loco_key=loco_key), archive_tags))
+
+    if any(archive is None for archive in archives):
         return None
 
-    if is_tag_provided:
-        tag_archive_name = "tag.zip"
-        tag_archive_path = download_zip(tag=tag, loco_key=loco_key, archive_name=tag_archive_name)
-        if tag_archive_path is None:
-            return None
+    if not quiet:
+        print("String resources downloaded successfully")
 
-    print("String resources downloaded successfully")
+    fingerprint = ",".join(archive.content_hash for archive in archives)
+    return LocoExport(archive_paths=[archive.archive_path for archive in archives], fingerprint=fingerprint)
 
-    android_extraction_folder = loco_tmp_dir + "/android"
-    with zipfile.ZipFile(android_archive_path, 'r') as zip_ref:
-        zip_ref.extractall(android_extraction_folder)
 
-    if is_tag_provided:
-        tag_extraction_folder = loco_tmp_dir + "/tag"
-        with zipfile.ZipFile(tag_archive_path, 'r') as zip_ref:
-            zip_ref.extractall(tag_extraction_folder)
+class LocoExport:
+    """
+    Strings exported by Loco, only keeping the keys that are also in the tag archive when a tag is provided.
 
-        output_res_folder = f"{loco_tmp_dir}/merged/res"
-        compute_intersection_of_res_folders(android_res_folder=get_res_folder_path(android_extraction_folder),
-                                            tag_res_folder=get_res_folder_path(tag_extraction_folder),
-                                            output_res_folder=output_res_folder)
-    else:
-        output_res_folder = get_res_folder_path(android_extraction_folder)
+    Each strings.xml is only decompressed once and kept in memory, along with its digests, so an export can be imported into
+    several projects. Trees are parsed again for each caller since the update modifies them.
+    """
+
+    def __init__(self, archive_paths, fingerprint):
+        self.archive_paths = archive_paths  # The android archive, followed by the tag archive when a tag is provided
+        self.fingerprint = fingerprint  # Identifies the content of the export to know if it has already been imported
+        self._members_per_archive = None
+        self._member_contents = {}
+        self._digests = {}
+        self._tag_names = {}
+
+    def __getstate__(self):
+        # Worker processes read the few members they need from the archives rather than receiving all of them
+        state = dict(self.__dict__)
+        state["_member_contents"] = {}
+        return state
 
-    return output_res_folder  # The path of the res directory
+    def read_root(self, value_folder):
+        """Returns a new tree of a single value folder, that the caller is free to modify"""
+        android_root = ET.fromstring(self._read_member(0, value_folder))
+        if len(self.archive_paths) == 1:
+            return android_root
 
+        return compute_intersection_to(android_root, self._read_tag_names(value_folder))
 
-def get_res_folder_path(archive_path):
-    return archive_path + "/" + [file for file in os.listdir(archive_path)][0] + "/res"
+    def value_folders(self):
+        members_per_archive = self._get_members_per_archive()
+        return [value_folder for value_folder in value_folders if all(value_folder in members for members in members_per_archive)]
 
+    def read_digests(self, value_folder):
+        if value_folder not in self._digests:
+            digests = dict(iter_element_digests(io.BytesIO(self._read_member(0, value_folder))))
+            if len(self.archive_paths) > 1:
+                tag_names = self._read_tag_names(value_folder)
+                digests = {name: digest for name, digest in digests.items() if name in tag_names}
+            self._digests[value_folder] = digests
 
-def compute_intersection_of_res_folders(android_res_folder, tag_res_folder, output_res_folder):
-    for folder in value_folders:
-        android_xml = f"{android_res_folder}/{folder}/strings.xml"
-        tag_xml = f"{tag_res_folder}/{folder}/strings.xml"
+        return self._digests[value_folder]
 
-        if os.path.exists(android_xml) and os.path.exists(tag_xml):
-            output = f"{output_res_folder}/{folder}/strings.xml"
-            compute_intersection_to(android_xml, tag_xml, output)
+    def _read_tag_names(self, value_folder):
+        # Only the names of the tag archive matter, so its strings are streamed instead of being parsed into a tree
+        if value_folder not in self._tag_names:
+            tag_member = io.BytesIO(self._read_member(1, value_folder))
+            self._tag_names[value_folder] = {elem.get('name') for elem in iter_top_level_elements(tag_member) if elem.get('name')}
 
+        return self._tag_names[value_folder]
 
-def compute_intersection_to(first_xml, second_xml, output_file_path):
+    def _read_member(self, archive_index, value_folder):
+        key = (archive_index, value_folder)
+        if key not in self._member_contents:
+            archive_path = self.archive_paths[archive_index]
+            self._member_contents[key] = read_archive_member(archive_path, self._get_members_per_archive()[archive_index][value_folder])
+
+        return self._member_contents[key]
+
+    def _get_members_per_archive(self):
+        if self._members_per_archive is None:
+            self._members_per_archive = [find_archive_members(archive_path) for archive_path in self.archive_paths]
+
+        return self._members_per_archive
+
+
+class StringResourceSet:
     """
-    Computes the intersection (common keys) of two Android strings XML files and
-    writes them to the output file. If the output file does not exist, it is created.
+    The parsed strings.xml of every value folder of a project or of a Loco export, indexed by locale and by key.
 
-    :param first_xml: Path to the first XML file
-    :param second_xml: Path to the second XML file
-    :param output_file_path: Path to the output XML file
+    Files are parsed only once per run: the update, the diff and the check of `ink loco` all work on the same trees.
     """
-    register_android_xml_namespaces()
 
-    # Parse input XMLs
-    tree_first = ET.parse(first_xml)
-    root_first = tree_first.getroot()
+    def __init__(self, roots=None):
+        self._roots = {}
+        self._elements = {}
+        for value_folder, root in (roots or {}).items():
+            self.set_root(value_folder, root)
+
+    @classmethod
+    def from_res_folder(cls, res_folder, parsed_roots=None):
+        """Parses the value folders of the res folder, except the ones whose tree is already given"""
+        roots = {}
+        for value_folder in value_folders:
+            file_path = f'{res_folder}/{value_folder}/strings.xml'
+            if parsed_roots is not None and value_folder in parsed_roots:
+                roots[value_folder] = parsed_roots[value_folder]
+            elif os.path.exists(file_path):
+                roots[value_folder] = ET.parse(file_path).getroot()
+        return cls(roots)
+
+    def set_root(self, value_folder, root):
+        """Replaces the tree of a value folder, or re-indexes it after it has been modified in place"""
+        self._roots[value_folder] = root
+        self._elements[value_folder] = {elem.get('name'): elem for elem in root if elem.get('name')}
+
+    def value_folders(self):
+        return [value_folder for value_folder in value_folders if value_folder in self._roots]
+
+    def __contains__(self, value_folder):
+        return value_folder in self._roots
 
-    tree_second = ET.parse(second_xml)
-    root_second = tree_second.getroot()
+    def root(self, value_folder):
+        return self._roots[value_folder]
 
-    # Build dicts of name -> element for quick lookup
-    first_dict = {elem.get('name'): elem for elem in root_first if elem.get('name')}
-    second_dict = {elem.get('name'): elem for elem in root_second if elem.get('name')}
+    def elements(self, value_folder):
+        """Returns the elements of the value folder by key"""
+        return self._elements.get(value_folder, {})
+
+
+def find_archive_members(archive_path):
+    """
+    Finds the strings.xml of each value folder inside the archive. Members are looked up by their path, which follows the
+    `<project>/res/<value folder>/strings.xml` layout of Loco's exports.
+    """
+    members = {}
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        for member_name in zip_ref.namelist():
+            parts = member_name.split("/")
+            if len(parts) >= 3 and parts[-1] == "strings.xml" and parts[-3] == "res" and parts[-2] in value_folders:
+                members[parts[-2]] = member_name
+
+    return members
+
+
+def read_archive_member(archive_path, member_name):
+    """Reads a file of the archive in memory, without extracting it"""
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        return zip_ref.read(member_name)
+
+
+def compute_intersection_to(root_first, names_second):
+    """
+    Computes the intersection (common keys) of an Android strings XML root and the keys of another one.
 
-    # Intersection of keys present in both files
-    common_keys = set(first_dict.keys()) & set(second_dict.keys())
+    The elements are moved to the output rather than copied, so `root_first` must not be used afterwards.
 
+    :param root_first: Root element of the first XML
+    :param names_second: Names of the keys of the second XML
+    :return: Root element containing the elements of the first XML whose key is also present in the second one
+    """
     root_output = ET.Element("resources")
 
     # Add elements (preserves plurals and nested items)
-    for elem in root_first:
-        name = elem.get('name')
-        if name and name in common_keys:
-            root_output.append(copy.deepcopy(elem))
-
-    tree_output = ET.ElementTree(root_output)
-    ET.indent(tree_output, space="    ", level=0)
+    root_output.extend(elem for elem in root_first if elem.get('name') in names_second)
 
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    ET.indent(root_output, space="    ", level=0)
 
-    tree_output.write(output_file_path, encoding="utf-8", xml_declaration=True)
+    return root_output
 
 
 def register_android_xml_namespaces():
@@ -156,41 +269,92 @@ def register_android_xml_namespaces():
     ET.register_namespace('app', 'http://schemas.android.com/apk/res-auto')
 
 
-def update_loco(target_ids, loco_update_strategy, extracted_dir_root):
+def update_loco(target_ids, loco_update_strategy, loco_export, force=False, keep_local_changes=False):
+    """
+    Imports the export into the project and returns the project's strings as they are after the import
+
+    :param keep_local_changes: Imports on top of the uncommitted changes of the strings instead of starting from their
+    committed state, so imports made one after the other add up
+    """
     os.chdir(project_root)
 
-    # Copy the strings.xml files from the archive to the project's values folder
-    has_initialized_new_strings = True
     project_path = loco_update_strategy.copy_target_folder
-    for value_folder in value_folders:
-        source_file_path = f'{extracted_dir_root}/{value_folder}/strings.xml'
+    updated_value_folders = loco_export.value_folders()
+    target_file_paths = [f'{project_path}/{value_folder}/strings.xml' for value_folder in updated_value_folders]
+
+    # Only a full import can be skipped, selected keys have to be imported even if they happen to be already up to date
+    is_full_import = not target_ids
+    if is_full_import and not force and is_export_already_applied(project_path, loco_export.fingerprint, target_file_paths):
+        print("String resources are already up to date")
+        return read_project_strings(loco_update_strategy)
+
+    existing_file_paths = [target_file_path for target_file_path in target_file_paths if os.path.exists(target_file_path)]
+    has_initialized_new_strings = len(existing_file_paths) == 0
+    if not keep_local_changes:
+        drop_git_diffs_if_any(existing_file_paths, loco_update_strategy.git_project_root)
+
+    new_value_folders = set()
+    for value_folder, target_file_path in zip(updated_value_folders, target_file_paths):
+        target_file = Path(target_file_path)
+        if not target_file.exists():  # Untracked files have been deleted by the previous step
+            new_value_folders.add(value_folder)
+            create_empty_file(target_file)
 
-        if not os.path.exists(source_file_path):
-            continue
+    # The header is lost when the file is rewritten so it's kept aside beforehand
+    headers = {target_file_path: read_header(target_file_path) for target_file_path in target_file_paths}
 
-        target_file_path = f'{project_path}/{value_folder}/strings.xml'
+    # Each value folder is parsed, merged and written independently of the others so they're handled in parallel. Files
+    # are only parsed now that the git diffs have been dropped so the import starts from a clean state
+    tasks = [
+        LocaleUpdateTask(value_folder=value_folder, target_file_path=target_file_path, loco_export=loco_export,
+                         selected_keys=target_ids, header=headers[target_file_path])
+        for value_folder, target_file_path in zip(updated_value_folders, target_file_paths)
+    ]
+    updated_roots = run_per_locale(update_locale, tasks, loco_update_strategy.locale_jobs,
+                                   work_size=get_files_size(target_file_paths))
 
-        target_file = Path(target_file_path)
-        is_this_file_new = not target_file.exists()
-        if is_this_file_new:
-            create_empty_file(target_file)
-        else:
-            has_initialized_new_strings = False
-            drop_git_diffs_if_any(target_file_path, loco_update_strategy.git_project_root)
+    project_strings = StringResourceSet.from_res_folder(project_path, parsed_roots=dict(zip(updated_value_folders, updated_roots)))
 
-        update_android_strings(current_xml_path=target_file_path, new_xml_path=source_file_path, selected_keys=target_ids,
-                               output_xml_path=target_file_path)
-        add_missing_new_line_at_end_of(target_file_path)
-        fix_loco_header(target_file_path, loco_update_strategy.git_project_root)
+    # Only used as a fallback for files whose header could not be found before they were rewritten
+    files_without_header = [target_file_path for target_file_path in target_file_paths if headers[target_file_path] is None]
+    fix_loco_headers(files_without_header, loco_update_strategy.git_project_root)
 
-        if is_this_file_new:
+    for value_folder, target_file_path in zip(updated_value_folders, target_file_paths):
+        if value_folder in new_value_folders:
             append_new_file_header(target_file_path)
 
     if has_initialized_new_strings:
         add_string_validation_ci_workflow()
 
+    if is_full_import:
+        mark_export_as_applied(project_path, loco_export.fingerprint, target_file_paths)
+
     print("String resources updated")
 
+    return project_strings
+
+
+@dataclass
+class LocaleUpdateTask:
+    value_folder: str
+    target_file_path: str
+    loco_export: LocoExport
+    selected_keys: list
+    header: str  # None when it could not be read, it's then brought back from git afterwards
+
+
+def update_locale(task):
+    """Imports the export into a single value folder and returns its updated tree. Runs in a worker process"""
+    root_current = ET.parse(task.target_file_path).getroot()
+    update_android_strings(root_current=root_current, root_new=task.loco_export.read_root(task.value_folder),
+                           selected_keys=task.selected_keys, output_xml_path=task.target_file_path, header=task.header)
+
+    return root_current
+
+
+def read_project_strings(loco_update_strategy):
+    return StringResourceSet.from_res_folder(loco_update_strategy.copy_target_folder)
+
 
 def create_empty_file(file):
     file.parent.mkdir(parents=True, exist_ok=True)
@@ -233,30 +397,60 @@ def append_new_file_header(path):
 <!--TODO-->""" + previous_content)
 
 
-def remove_downloaded_strings():
-    shutil.rmtree(loco_tmp_dir)
-    print("Deleting temporary downloaded strings resources")
+def compute_project_diffs(loco_update_strategy, loco_export, project_strings=None, list_keys=False):
+    """
+    Compares the project to the export. When the project strings have not been parsed by a previous step, both sides are
+    streamed so no tree is ever built.
+    """
+    id_diffs = compute_id_diffs_per_value_folder(loco_update_strategy, loco_export, project_strings)
+    pretty_print_diff({get_ui_acronym_of(value_folder): diff for value_folder, diff in id_diffs.items()}, list_keys)
+
+
+def get_changed_keys(loco_update_strategy, loco_export):
+    """Returns the names of the keys added, updated or removed by the export in any value folder of the project"""
+    changed_keys = set()
+    for diff in compute_id_diffs_per_value_folder(loco_update_strategy, loco_export).values():
+        changed_keys.update(diff.added_names, diff.updated_names, diff.removed_names)
+
+    return sorted(changed_keys)
 
 
-def compute_project_diffs(loco_update_strategy, extracted_dir_root):
+def compute_id_diffs_per_value_folder(loco_update_strategy, loco_export, project_strings=None):
     project_path = loco_update_strategy.copy_target_folder
 
-    id_diffs = {}
-    for value_folder in value_folders:
-        # TODO: Factorize
-        source_file = f'{extracted_dir_root}/{value_folder}/strings.xml'
+    tasks = []
+    for value_folder in loco_export.value_folders():
+        digests_before = None
+        if project_strings is not None:
+            digests_before = get_element_digests(project_strings.elements(value_folder))
 
-        if not os.path.exists(source_file):
-            continue
+        tasks.append(LocaleDiffTask(target_file_path=f'{project_path}/{value_folder}/strings.xml', value_folder=value_folder,
+                                    loco_export=loco_export, digests_before=digests_before))
+
+    diffs = run_per_locale(compute_locale_diff, tasks, loco_update_strategy.locale_jobs,
+                           work_size=get_files_size(task.target_file_path for task in tasks))
+
+    return {task.value_folder: diff for task, diff in zip(tasks, diffs)}
 
-        target_file = f'{project_path}/{value_folder}/strings.xml'
 
-        id_diffs[get_ui_acronym_of(value_folder)] = compute_file_diffs(target_file, source_file)
+@dataclass
+class LocaleDiffTask:
+    target_file_path: str
+    value_folder: str
+    loco_export: LocoExport
+    digests_before: dict  # None when the project file still has to be streamed
+
+
+def compute_locale_diff(task):
+    """Compares a single value folder of the project to the export. Runs in a worker process"""
+    digests_before = task.digests_before
+    if digests_before is None:
+        digests_before = read_file_digests(task.target_file_path)
 
-    pretty_print_diff(id_diffs)
+    return get_id_diffs(digests_before=digests_before, digests_after=task.loco_export.read_digests(task.value_folder))
 
 
-def pretty_print_diff(id_diffs):
+def pretty_print_diff(id_diffs, list_keys=False):
     print("\nStatus compared to the remote")
     all_equal = all(v == next(iter(id_diffs.values())) for v in id_diffs.values())
     if all_equal:
@@ -265,23 +459,61 @@ def pretty_print_diff(id_diffs):
         for language, diff in id_diffs.items():
             print(f"[{language}]: {diff.get_ui_formatted_string()}")
 
+    if list_keys:
+        print_changed_keys("Added", {language: diff.added_names for language, diff in id_diffs.items()}, Colors.green)
+        print_changed_keys("Updated", {language: diff.updated_names for language, diff in id_diffs.items()}, Colors.blue)
+        print_changed_keys("Removed", {language: diff.removed_names for language, diff in id_diffs.items()}, Colors.red)
 
-def download_zip(tag, loco_key, archive_name):
-    zip_url = f"https://localise.biz/api/export/archive/xml.zip?format=android&filter={tag}&fallback=en&order=id&key={loco_key}"
 
-    response = requests.get(zip_url)
+def print_changed_keys(title, names_per_language, rgb):
+    languages_per_name = {}
+    for language, names in names_per_language.items():
+        for name in names:
+            languages_per_name.setdefault(name, []).append(language)
+
+    if not languages_per_name:
+        return
+
+    print(f"\n{title}:")
+    for name in sorted(languages_per_name):
+        languages = languages_per_name[name]
+        # Languages are only detailed when the key didn't change the same way everywhere
+        suffix = "" if len(languages) == len(names_per_language) else f" [{', '.join(languages)}]"
+        print(f"  {color(name, rgb)}{suffix}")
+
 
-    if response.status_code != 200:
-        print("Error: When trying to download translations received response.status_code =", response.status_code)
+def download_zip(tag, loco_key):
+    zip_url = f"https://localise.biz/api/export/archive/xml.zip?format=android&filter={tag}&fallback=en&order=id&key={loco_key}"
+    archive_cache = LocoArchiveCache(zip_url)
+
+    try:
+        with get_http_session().get(zip_url, stream=True, timeout=download_timeout,
+                                    headers=archive_cache.conditional_headers()) as response:
+            if response.status_code == 304:  # Not modified since the cached version
+                return archive_cache
+
+            if response.status_code != 200:
+                print("Error: When trying to download translations received response.status_code =", response.status_code)
+                return None
+
+            archive_cache.store(response, chunk_size=download_chunk_size)
+    except requests.RequestException as exception:
+        # Network errors are reported like bad statuses so a long running watch can try again at the next poll
+        print("Error: When trying to download translations could not reach Loco:", exception)
         return None
 
-    os.makedirs(loco_tmp_dir, exist_ok=True)
+    return archive_cache
 
-    archive_path = loco_tmp_dir + "/" + archive_name
-    with open(archive_path, "wb+") as f:
-        f.write(response.content)
 
-    return archive_path
+def get_http_session():
+    """
+    Returns the HTTP session shared by every Loco download of the current process. Reusing it keeps the TLS connection alive
+    between the archives of a project and between the projects synced in the same run.
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
 
 
 def join_to_string(item_list):
@@ -291,59 +523,65 @@ def join_to_string(item_list):
         return ',' + ','.join(f"!{item}" for item in item_list)
 
 
-def drop_git_diffs_if_any(target_file, git_project_root):
-    relative_path = target_file[len(git_project_root) + 1:]
+def drop_git_diffs_if_any(target_files, git_project_root):
+    """Restores the tracked files and deletes the untracked ones, with a single git call for each of these steps"""
+    relative_path_to_file = {get_git_relative_path(target_file, git_project_root): target_file for target_file in target_files}
+    if not relative_path_to_file:
+        return
 
-    # Check if file is tracked by git
+    # Only the tracked files among the given paths get listed
     result = subprocess.run(
-        ["git", "ls-files", "--error-unmatch", relative_path],
+        ["git", "ls-files", "-z", "--", *relative_path_to_file.keys()],
         cwd=git_project_root,
-        stdout=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL,
+        universal_newlines=True,
     )
+    if result.returncode != 0:  # Not a git repository, there's no clean version to come back to
+        return
 
-    if result.returncode == 0:
-        # File is tracked → restore it
-        subprocess.run(["git", "restore", "--", relative_path], cwd=git_project_root, check=True)
-    else:
-        # File is untracked → optionally delete it
-        if os.path.exists(target_file):
+    tracked_files = {os.path.abspath(os.path.join(git_project_root, path)) for path in result.stdout.split("\0") if path}
+
+    tracked_relative_paths = []
+    for relative_path, target_file in relative_path_to_file.items():
+        if os.path.abspath(target_file) in tracked_files:
+            tracked_relative_paths.append(relative_path)
+        elif os.path.exists(target_file):
+            # File is untracked → optionally delete it
             os.remove(target_file)
 
+    if tracked_relative_paths:
+        subprocess.run(["git", "restore", "--", *tracked_relative_paths], cwd=git_project_root, check=True)
 
-def update_android_strings(current_xml_path, new_xml_path, selected_keys, output_xml_path):
+
+def get_git_relative_path(target_file, git_project_root):
+    return target_file[len(git_project_root) + 1:]
+
+
+def update_android_strings(root_current, root_new, selected_keys, output_xml_path, header=None):
     """
     Updates Android string resources by merging changes from new XML into current XML.
     
     Args:
-        current_xml_path: Path to current strings.xml file
-        new_xml_path: Path to new strings.xml file with updates
+        root_current: Root element of the current strings.xml, updated in place
+        root_new: Root element of the new strings.xml with updates
         selected_keys: List of key names to update (empty list means update all)
         output_xml_path: Path where updated XML should be written
+        header: Text to write before the `<resources>` tag, if any
     """
     register_android_xml_namespaces()
 
-    # Parse both XML files
-    tree_current = ET.parse(current_xml_path)
-    root_current = tree_current.getroot()
-
-    tree_new = ET.parse(new_xml_path)
-    root_new = tree_new.getroot()
-
     saved_attributes = _extract_xml_attributes(root_current)
 
     # Convert selected_tags list to set for faster lookup
     selected_keys_set = set(selected_keys)
 
     # Process XML content
-    _remove_selected_keys(root_current, selected_keys_set)
-    _insert_new_keys(root_new, root_current, selected_keys_set)
-    _sort_and_reorganize_elements(root_current)
+    root_current[:] = _merge_elements(root_current, root_new, selected_keys_set)
 
     _apply_xml_attributes(root_current, saved_attributes)
 
-    indent_android_strings_xml(root_current)
-    tree_current.write(output_xml_path, encoding="utf-8")
+    write_android_strings_xml(root_current, output_xml_path, header)
 
 
 def _extract_xml_attributes(root):
@@ -370,59 +608,96 @@ def _apply_xml_attributes(root, key_to_attributes_dict):
             elem.set(attribute, value)
 
 
-def _remove_selected_keys(root_current, selected_tags_set):
-    """Remove tags from current XML that need to be updated."""
-    for elem in list(root_current):
-        name = elem.get('name')
-        if (len(selected_tags_set) == 0 and name not in ignored_ids) or name in selected_tags_set:
-            root_current.remove(elem)
+def _merge_elements(root_current, root_new, selected_tags_set):
+    """
+    Returns the children of the updated XML: current tags that are not updated followed by the new tags, with translatable
+    tags sorted alphabetically by name after the non-translatable ones that keep their order.
+
+    The list is built in one pass over each tree instead of removing tags one by one from the current XML, which is quadratic.
+    """
+    if len(selected_tags_set) == 0:
+        kept_elems = [e for e in root_current if e.get('name') in ignored_ids]
+        new_elems = list(root_new)
+    else:
+        kept_elems = [e for e in root_current if e.get('name') not in selected_tags_set]
+        new_elems = [e for e in root_new if e.get('name') in selected_tags_set]
+
+    non_translatable_elems = []
+    translatable_elems = []
+    for elem in kept_elems + new_elems:
+        if elem.get('translatable') == 'false':
+            non_translatable_elems.append(elem)
+        else:
+            translatable_elems.append(elem)
+
+    # Both trees are usually sorted already so this only merges two sorted runs, in linear time
+    translatable_elems.sort(key=lambda e: e.get('name') or "")
+
+    return non_translatable_elems + translatable_elems
+
 
+def read_file_digests(file_path):
+    if not os.path.exists(file_path):
+        return {}
 
-def _insert_new_keys(root_new, root_current, selected_tags_set):
-    """Insert new tags from source XML into target XML."""
-    for elem in root_new:
+    with open(file_path, "rb") as f:
+        return dict(iter_element_digests(f))
+
+
+def iter_element_digests(source):
+    """Streams the keys of a strings.xml with the digest of their content"""
+    for elem in iter_top_level_elements(source):
         name = elem.get('name')
-        if len(selected_tags_set) == 0 or name in selected_tags_set:
-            root_current.append(elem)
+        if name:
+            yield name, compute_element_digest(elem)
 
 
-def _sort_and_reorganize_elements(root_current):
-    """Sort translatable elements while preserving non-translatable order."""
-    non_translatable_elems = [e for e in root_current if e.get('translatable') == 'false']
-    translatable_elems = [e for e in root_current if e.get('translatable') != 'false']
+def iter_top_level_elements(source):
+    """
+    Streams the direct children of the root of a strings.xml. Each element is cleared once the consumer is done with it so
+    the memory usage doesn't depend on the size of the file.
+    """
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if root is None:
+                root = elem
+            continue
 
-    # Sort only the translatable ones alphabetically by name
-    translatable_elems.sort(key=lambda e: e.get('name') or "")
+        depth -= 1
+        if depth == 1:  # Direct child of <resources>
+            yield elem
+            root.clear()
 
-    # Combine back (non-translatable first, sorted translatable after)
-    root_current[:] = non_translatable_elems + translatable_elems
 
+def get_element_digests(elements):
+    return {name: compute_element_digest(elem) for name, elem in elements.items()}
 
-# Ugly fix to remove this persistent issues with the formatting of the last closing </resources> tag
-def _fix_closing_tag_indent(output_xml_path):
-    path = Path(output_xml_path)
-    text = path.read_text()
-    if text.endswith("    </resources>"):
-        path.write_text(text[:-len("    </resources>")] + "</resources>")
 
+def compute_element_digest(elem):
+    """
+    Hashes what a translator can change about a key: its kind, its text including any inline markup, and the text of each
+    quantity of plurals. Attributes and indentation are ignored.
+    """
+    if elem.tag == "plurals":
+        content = [(item.get('quantity'), _get_normalized_content(item)) for item in elem]
+    else:
+        content = _get_normalized_content(elem)
 
-def compute_file_diffs(old_file, new_file):
-    return get_id_diffs(root_before=ET.parse(old_file).getroot(), root_after=ET.parse(new_file).getroot())
+    return hashlib.sha1(repr((elem.tag, content)).encode("utf-8")).digest()
 
 
-def get_id_diffs(root_before, root_after):
-    # Build lookup maps by name for both XML roots
-    current_map = {
-        elem.get('name'): (elem.text or "").strip()
-        for elem in root_before if elem.get('name')
-    }
-    new_map = {
-        elem.get('name'): (elem.text or "").strip()
-        for elem in root_after if elem.get('name')
-    }
+def _get_normalized_content(elem):
+    content = (elem.text or "") + "".join(ET.tostring(child, encoding="unicode") for child in elem)
+    # Whitespaces are collapsed since the indentation of inline markup differs between Loco and formatted project files
+    return " ".join(content.split())
+
 
-    current_names = set(current_map.keys())
-    new_names = set(new_map.keys())
+def get_id_diffs(digests_before, digests_after):
+    current_names = set(digests_before.keys())
+    new_names = set(digests_after.keys())
 
     # Compute sets
     added_names = new_names - current_names
@@ -436,13 +711,16 @@ def get_id_diffs(root_before, root_after):
 
     # Compute updated (content-changed) entries
     updated_names = {
-        name for name in common_names if current_map[name] != new_map[name]
+        name for name in common_names if digests_before[name] != digests_after[name]
     }
 
     return IdDiff(
         added=len(added_names),
         removed=len(removed_names),
         updated=len(updated_names),
+        added_names=sorted(added_names),
+        removed_names=sorted(removed_names),
+        updated_names=sorted(updated_names),
     )
 
 
@@ -451,6 +729,10 @@ class IdDiff:
     added: int = 0
     removed: int = 0
     updated: int = 0
+    # Not compared so locales that changed the same amount of keys are still grouped together when printed
+    added_names: list = field(default_factory=list, compare=False)
+    removed_names: list = field(default_factory=list, compare=False)
+    updated_names: list = field(default_factory=list, compare=False)
 
     def get_ui_formatted_string(self):
         to_add = color(self.added, Colors.green) if self.added > 0 else self.added
@@ -464,40 +746,85 @@ def get_ui_acronym_of(value_folder):
     return parts[-1] if len(parts) > 1 else 'en'
 
 
-def add_missing_new_line_at_end_of(target_file):
-    # It's ok to assume the file only contains characters in utf-8
-    with open(target_file, "rb+") as f:
-        f.seek(-1, 2)  # go to the last byte
-        if f.read(1) != b'\n':  # check if it's not a newline
-            f.write(b'\n')  # add one if missing
-
+def read_header(target_file):
+    """
+    Returns everything written before the opening `<resources` tag (xml declaration, license comment, ...) or None if the tag
+    could not be found
+    """
+    header_lines = []
+    with open(target_file, "r") as fd:
+        for line in fd:
+            if line.startswith("<resources"):
+                return "".join(header_lines).removesuffix("\n")
+            header_lines.append(line)
 
-def fix_loco_header(target_file, git_project_root):
-    walker = HeaderDiffWalker()
-    walker.run(target_file, git_project_root)
+    return None
 
-    replace_with = "\n".join(walker.removed_lines)
 
+def prepend_header(target_file, header):
     with open(target_file, "r") as fd:
         original_content = fd.read()
 
     with open(target_file, "w") as fd:
-        fd.write(replace_with + "\n" + original_content)
+        fd.write(header + "\n" + original_content)
+
+
+def fix_loco_headers(target_files, git_project_root):
+    """Brings back the header of each file using a single git diff for all of them"""
+    diff_per_file = get_diff_per_file(target_files, git_project_root)
+
+    for target_file in target_files:
+        walker = HeaderDiffWalker()
+        walker.walk_diff(diff_per_file.get(target_file, ""))
+        apply_header(target_file, walker)
+
+
+def apply_header(target_file, walker):
+    prepend_header(target_file, "\n".join(walker.removed_lines))
 
     if len(walker.added_lines) > 0:
         print("Warning: When trying to bring back the previous header, an unexpected diff with added lines has been detected")
 
 
+def get_diff_per_file(target_files, git_project_root):
+    """Runs one git diff for all the files and splits its output into the diff of each of them"""
+    if not target_files:
+        return {}
+
+    # -U0 forces the git diff to have zero padding lines around the diff to avoid breaking the detection
+    result = subprocess.run(
+        ["git", "diff", "--no-color", "--no-ext-diff", "-U0", "--",
+         *[get_git_relative_path(target_file, git_project_root) for target_file in target_files]],
+        stdout=subprocess.PIPE, universal_newlines=True, cwd=git_project_root,
+    )
+
+    # Paths in the diff are relative to the root of the repository so they are matched against the end of each file path
+    normalized_target_files = {os.path.abspath(target_file): target_file for target_file in target_files}
+    diff_per_file = {}
+    for file_diff in result.stdout.split("\ndiff --git "):
+        new_path_line = next((line for line in file_diff.split("\n") if line.startswith("+++ ")), None)
+        if new_path_line is None:
+            continue
+
+        diff_path = "/" + new_path_line[len("+++ b/"):]
+        for normalized_target_file, target_file in normalized_target_files.items():
+            if normalized_target_file.endswith(diff_path):
+                diff_per_file[target_file] = file_diff
+                break
+
+    return diff_per_file
+
+
 class DiffWalker:
     def walk(self, line, line_diff_type):
         pass
 
-    def run(self, target_file, git_project_root):
-        # -U0 forces the git diff to have zero padding lines around the diff to avoid breaking the detection
-        result = subprocess.run(f"git diff -U0 {target_file}", stdout=subprocess.PIPE, shell=True, universal_newlines=True,
-                                cwd=git_project_root)
-        diff = result.stdout
-        for line in diff.split("\n")[5:]:
+    def walk_diff(self, diff):
+        """Walks the lines of the diff of a single file, starting at its first hunk"""
+        lines = diff.split("\n")
+        first_hunk_index = next((index for index, line in enumerate(lines) if line.startswith("@@")), len(lines))
+
+        for line in lines[first_hunk_index + 1:]:
             if len(line) == 0:
                 continue
 
@@ -545,47 +872,107 @@ class LineDiffType(Enum):
     nothing = 2
 
 
-def validate_strings(loco_update_strategy):
-    error_count = 0
+def validate_strings(project_strings, loco_update_strategy, force=False):
+    """
+    Validates the strings of the project and returns the amount of errors found. Strings that passed validation are
+    cached so only the ones that changed since the last check are validated again, unless `force` is set.
+    """
+    validation_cache = ValidationCache(loco_update_strategy.copy_target_folder,
+                                       compute_package_version(os.path.dirname(loco_validator.__file__)))
+    entries_per_language = {}
     key_translations = {}
 
-    project_path = loco_update_strategy.copy_target_folder
-    for value_folder in value_folders:
-        current_file = f'{project_path}/{value_folder}/strings.xml'
-
-        if not os.path.exists(current_file):
-            continue
-
-        tree = ET.parse(current_file)
-
-        parts = value_folder.split("-")
-        language = "en" if len(parts) < 2 else parts[-1]
+    for value_folder in project_strings.value_folders():
+        language = get_ui_acronym_of(value_folder)
+        entries = []
 
-        for element in tree.getroot():
+        for element in project_strings.root(value_folder):
             tag = element.tag
             name = element.get("name")
-            value = element.text
 
             if tag == "string":
-                error_count += loco_validator.validate_string(language, name, value)
-                key_translations.setdefault(name, {})[language] = value
+                entries.append((name, element.text))
             elif tag == "plurals":
-                error_count += validate_plural(element, language, name, key_translations)
+                entries.extend(get_plural_entries(element, name))
 
-    for name, translations in key_translations.items():
-        error_count += loco_validator.validate_key_across_locales(name, translations)
+        for name, value in entries:
+            key_translations.setdefault(name, {})[language] = value
 
-    return error_count
+        entries_per_language[language] = entries
 
+    tasks = [
+        (language, [(name, value) for name, value in entries if force or not validation_cache.is_string_valid(language, name, value)])
+        for language, entries in entries_per_language.items()
+    ]
+    # A key is checked across locales again as soon as its value changed in any locale, or a locale was added or removed
+    keys_to_check = [
+        name for name, translations in key_translations.items() if force or not validation_cache.is_key_valid(name, translations)
+    ]
 
-def validate_plural(plural, language, name, key_translations):
-    error_count = 0
+    work_size = sum(len(value or "") for _, entries in tasks for _, value in entries)
+
+    # Each locale is validated on its own, then keys are split in as many chunks as there are workers for the checks that
+    # compare locales together
+    locale_results = run_per_locale(validate_locale_entries, tasks, loco_update_strategy.locale_jobs, work_size)
 
-    for element in plural:
-        plural_name = f"{name}-{element.get('quantity')}"
-        plural_value = element.text
+    chunk_size = max(1, -(-len(keys_to_check) // max(1, loco_update_strategy.locale_jobs)))
+    key_chunks = [
+        {name: key_translations[name] for name in keys_to_check[i:i + chunk_size]} for i in range(0, len(keys_to_check), chunk_size)
+    ]
+    key_results = run_per_locale(validate_keys_across_locales, key_chunks, loco_update_strategy.locale_jobs, work_size)
 
-        error_count += loco_validator.validate_string(language, plural_name, plural_value)
-        key_translations.setdefault(plural_name, {})[language] = plural_value
+    error_count = 0
+    invalid_names = set()
+    for (chunk_error_count, chunk_invalid_names), output in locale_results:
+        print(output, end="")
+        error_count += chunk_error_count
+        invalid_names.update(chunk_invalid_names)
+
+    for (chunk_error_count, chunk_invalid_names), output in key_results:
+        print(output, end="")
+        error_count += chunk_error_count
+        invalid_names.update(chunk_invalid_names)
+
+    # Only keys without any error are cached so invalid ones keep being reported until they are fixed
+    validation_cache.save(
+        valid_strings={
+            language: {name: value for name, value in entries if name not in invalid_names}
+            for language, entries in entries_per_language.items()
+        },
+        valid_keys={name: translations for name, translations in key_translations.items() if name not in invalid_names},
+    )
 
     return error_count
+
+
+def get_plural_entries(plural, name):
+    return [(f"{name}-{element.get('quantity')}", element.text) for element in plural]
+
+
+def validate_locale_entries(task):
+    """
+    Validates the strings of a single locale and returns the error count and the names of the invalid strings, with the
+    output of the validator
+    """
+    language, entries = task
+    return run_capturing_output(
+        count_errors, ((name, loco_validator.validate_string(language, name, value)) for name, value in entries)
+    )
+
+
+def validate_keys_across_locales(key_translations):
+    return run_capturing_output(
+        count_errors,
+        ((name, loco_validator.validate_key_across_locales(name, translations)) for name, translations in key_translations.items())
+    )
+
+
+def count_errors(error_count_per_name):
+    error_count = 0
+    invalid_names = []
+    for name, name_error_count in error_count_per_name:
+        if name_error_count > 0:
+            error_count += name_error_count
+            invalid_names.append(name)
+
+    return error_count, invalid_names
@@ -3,34 +3,25 @@
 
 import argparse
 import glob
+import importlib
 import pathlib
 import re
 import signal
 import subprocess
 import sys
-from contextlib import contextmanager
 
 import config
-import cross_app_login_config
-import database as db
-import eml_writer as ew
 import font_size
-import loco_updater as lu
 import login as lg
 import navbar_mode
 import projects
 from adb import adb, select_device, close_app, open_app, select_device_or_all, warn_if_current_project_app_is_not_focused
 from adb_prop import show_layout_bounds, show_layout_bars
 from common_utils import select_in_list, accept_substitution, ink_folder, cancel_ink_command
-from translate import translate_command
 from translate.languages import allowed_quantities, get_languages_for_project
 from updater import check_for_updates, rm_cache as update_rm_cache, update_git_project, update_cmd
 
 
-class LocoImportError(Exception):
-    pass
-
-
 def show_version(args):
     cwd = config.script_folder
     branch = subprocess.run(
@@ -48,6 +39,8 @@ def show_version(args):
 
 
 def generate_eml(args):
+    import eml_writer as ew
+
     html = accept_substitution(args.html)
     ew.new_eml(args.subject, args.sender, args.to, args.cc, args.with_date, html)
 
@@ -71,125 +64,6 @@ def copy_last_video(args):
         subprocess.Popen(("open", destination + filename), cwd=None)
 
 
-def update_loco(args):
-    project_keys = args.projects if args.projects else [config.project_key]
-    failed_projects = []
-
-    for project in project_keys:
-        if len(project_keys) > 1:
-            print(f"\n* Processing project {project}")
-
-        project_root = config.manually_get_project(project, "global", "project_root")
-        res_folder_path = "/src/main/res"
-        module = get_module_or_default(args, "")
-
-        loco_update_strategy = lu.LocoUpdateStrategy(
-            # If only checking strings validity, no need to raise an error for a missing loco api key
-            api_key=config.manually_get_project(project, "loco", "loco_key", raise_error=not args.check),
-            copy_target_folder=project_root + module + res_folder_path,
-            git_project_root=project_root,
-        )
-
-        try:
-            import_strings(args, loco_update_strategy, args.tag)
-        except LocoImportError as _:
-            failed_projects.append(project)
-
-    if failed_projects:
-        if len(project_keys) > 1:
-            print(f"\nFailed projects: {', '.join(failed_projects)}")
-        exit(1)
-
-
-def update_loco_core(args):
-    project_keys = args.projects if args.projects else [config.project_key]
-    failed_projects = []
-
-    for project in project_keys:
-        if len(project_keys) > 1:
-            print(f"\nProcessing project {project}")
-
-        project_root = config.manually_get_project(project, "global", "project_root")
-        res_folder_path = "/src/main/res"
-        module = get_module_or_default(args, "/../Core/Common")
-
-        loco_update_strategy = lu.LocoUpdateStrategy(
-            # If only checking strings validity, no need to raise an error for a missing loco api key
-            api_key=config.get_global("loco", "core_key", raise_error=not args.check),
-            copy_target_folder=project_root + module + res_folder_path,
-            git_project_root=project_root + "/../Core",
-        )
-
-        try:
-            import_strings(args, loco_update_strategy, args.tag)
-        except LocoImportError as _:
-            failed_projects.append(project)
-
-    if failed_projects:
-        if len(project_keys) > 1:
-            print(f"\nFailed projects: {', '.join(failed_projects)}")
-        exit(1)
-
-
-def get_module_or_default(args, default):
-    return default if args.module is None else "/../" + args.module
-
-
-def import_strings(args, loco_update_strategy, feature_tag):
-    @contextmanager
-    def download_resources():
-        try:
-            extracted_dir_root = lu.download_strings(loco_update_strategy, feature_tag)
-            if None:
-                raise LocoImportError("Failed to download strings")
-
-            yield extracted_dir_root
-        finally:
-            lu.remove_downloaded_strings()
-
-    def update_resources(extracted_dir_root):
-        lu.update_loco(args.target_ids, loco_update_strategy, extracted_dir_root)
-
-    def compute_diffs(extracted_dir_root):
-        lu.compute_project_diffs(loco_update_strategy, extracted_dir_root)
-        print()
-
-    def check_resources():
-        print("\nSearching for errors in imported strings")
-        error_count = lu.validate_strings(loco_update_strategy)
-        if error_count == 0:
-            print("Found no error")
-        else:
-            accord = "s" if error_count > 1 else ""
-            print(f"\nFound {error_count} error{accord}")
-            if args.verbose:
-                print("\n[verbose]")
-                print("To fix this issue:")
-                print("  • Correct the strings and re-import translations into the project.")
-                print("  • If this is a false positive, add the string ID as an exception in loco_validator/validator.py, "
-                      "then confirm with the project maintainers.")
-            raise LocoImportError("Found errors in imported strings")
-
-    # Determine what operations we need
-    is_default_case = not args.diff and not args.check  # The default case with no args
-    is_tag_provided = args.target_ids is not None and len(args.target_ids) > 0
-
-    needs_download = is_default_case or args.diff
-    needs_update = is_default_case
-    needs_check = is_default_case or args.check
-    needs_diff = (is_default_case and is_tag_provided) or args.diff
-
-    if needs_download:
-        with download_resources() as downloaded_folder:
-            if needs_update:
-                update_resources(downloaded_folder)
-            if needs_diff:
-                compute_diffs(downloaded_folder)
-
-    if needs_check:
-        check_resources()
-
-
 def login(args):
     lg.login(args.add, args.web, args.from_email, args.manual)
 
@@ -410,6 +284,43 @@ def catch_empty_calls(parser):
     return lambda _: parser.print_usage()
 
 
+def lazy_command(module_name, function_name):
+    """
+    Returns the callback of a command whose module is only imported once the command is run, so the dependencies of the
+    heaviest commands don't slow down the startup of every other one.
+    """
+    def run_command(args):
+        return getattr(importlib.import_module(module_name), function_name)(args)
+
+    return run_command
+
+
+class LazyArgumentParser(argparse.ArgumentParser):
+    """
+    Parser whose costly arguments, like the ones read from the settings, are only added when the command line is parsed with
+    it, which only happens for the command that is run. Sub parsers use the class of their parent, so they are lazy too.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_argument_adders = []
+
+    def add_lazy_arguments(self, add_arguments):
+        self.lazy_argument_adders.append(add_arguments)
+
+    def parse_known_args(self, args=None, namespace=None):
+        while self.lazy_argument_adders:
+            self.lazy_argument_adders.pop(0)(self)
+        return super().parse_known_args(args, namespace)
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def add_all_device_arg(parser):
     parser.add_argument("-ad", "--all-devices", action="store_true", default=False, help="apply to all connected devices")
 
@@ -434,9 +345,9 @@ def define_commands(parser):
                                                          "cache but keeps the account logged in using adb")
     add_restart_app_arg(db_clear_parser)
     add_all_device_arg(db_clear_parser)
-    db_clear_parser.set_defaults(func=db.clear_mail_db)
+    db_clear_parser.set_defaults(func=lazy_command("database", "clear_mail_db"))
     db_open_parser = db_subparser.add_parser("open", help="pulls and open a db file")
-    db_open_parser.set_defaults(func=db.open_db)
+    db_open_parser.set_defaults(func=lazy_command("database", "open_db"))
 
     # Show amount of commits on main
     version_parse = subparsers.add_parser("version", help="shows the current version as the number of commits on origin/main")
@@ -477,25 +388,36 @@ def define_commands(parser):
                             help="only checks if strings in the project are correctly formatted but do not import")
         parser.add_argument("-d", "--diff", action="store_true", default=False,
                             help="only prints differences between local version and remote")
+        parser.add_argument("-l", "--list-keys", action="store_true", default=False,
+                            help="also lists the name of the keys to add, update or remove when printing differences")
         parser.add_argument("-v", "--verbose", action="store_true", default=False,
                             help="details steps to solve the issue")
         parser.add_argument("-t", "--tag", dest="tag", help="only pull strings from this tag")
         parser.add_argument("-m", "--module", dest="module",
                             help="manually specify the module path relatively to the root of the project 'Core/Auth'")
+        parser.add_argument("-f", "--force", action="store_true", default=False,
+                            help="import strings even if the Loco export did not change since the last import and "
+                                 "validate strings even if they passed the last check")
+        parser.add_argument("-j", "--jobs", type=positive_int, default=1,
+                            help="number of projects given with --projects to process in parallel")
+        parser.add_argument("-w", "--watch", action="store_true", default=False,
+                            help="keep polling Loco and import the keys that changed as soon as they are exported")
+        parser.add_argument("--interval", type=positive_int, default=30,
+                            help="number of seconds between two polls of Loco with --watch")
         parser.add_argument("target_ids", nargs="*", help="limit string ids that get added")
 
     loco_parser = subparsers.add_parser("loco",
                                         help="automatically import loco and remove loco's autogenerated header. Also needed if you want to manually specify a module outside of Core")
     add_loco_arguments(loco_parser)
     add_project_arg(loco_parser)
-    loco_parser.set_defaults(func=update_loco)
+    loco_parser.set_defaults(func=lazy_command("loco_command", "update_loco"))
 
     # Loco core
     loco_core_parser = subparsers.add_parser("lococore",
                                              help="import core's loco project just like the classic loco method. Also needed if you want to manually specify a module inside of Core")
     add_loco_arguments(loco_core_parser)
     add_project_arg(loco_core_parser)
-    loco_core_parser.set_defaults(func=update_loco_core)
+    loco_core_parser.set_defaults(func=lazy_command("loco_command", "update_loco_core"))
 
     # Login
     login_parser = subparsers.add_parser("login", help="automated the process of logging in")
@@ -632,7 +554,7 @@ def define_commands(parser):
     new_module_parser = subparsers.add_parser("crossapplogin",
                                               help="modifies the code of the projet to make cross app login work on preprod")
     add_project_arg(new_module_parser)
-    new_module_parser.set_defaults(func=cross_app_login_config.add_preprod_cross_app_login_config)
+    new_module_parser.set_defaults(func=lazy_command("cross_app_login_config", "add_preprod_cross_app_login_config"))
 
     # Translate
     add_translate_subparser(subparsers)
@@ -718,10 +640,20 @@ def add_translate_subparser(subparsers):
         "-C", "--core", dest="core", action="store_true", default=False,
         help="if provided, the translation will be uploaded to CoreUI instead of the current project"
     )
+    translate_parser.add_argument(
+        "-f", "--from-file", dest="from_file",
+        help="translate and upload every key of a YAML (.yml), JSONL (.jsonl) or CSV (.csv) file at once, each key with its "
+             "own seeds, context and tags. Tags given with --tag apply to the keys of the file without tags"
+    )
 
-    languages = get_languages_for_project()
-    for language in languages:
-        translate_parser.add_argument(
+    # The languages are read from the settings, which is only worth it when running the translate command
+    translate_parser.add_lazy_arguments(add_translate_language_arguments)
+    translate_parser.set_defaults(func=lazy_command("translate.translate_command", "run"), seeds=None)
+
+
+def add_translate_language_arguments(parser):
+    for language in get_languages_for_project():
+        parser.add_argument(
             f"--{language}",
             dest="seeds",
             action=TranslationSeedAction,
@@ -735,8 +667,6 @@ def add_translate_subparser(subparsers):
             ),
         )
 
-    translate_parser.set_defaults(func=translate_command.run, seeds=None)
-
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal_handler)
@@ -744,7 +674,7 @@ if __name__ == '__main__':
     raw_args = ' '.join(sys.argv[1:])
     check_for_updates(raw_args)
 
-    parser = argparse.ArgumentParser()  # (description="Arguments for kmail")
+    parser = LazyArgumentParser()  # (description="Arguments for kmail")
     parser.set_defaults(func=catch_empty_calls(parser))
 
     define_commands(parser)
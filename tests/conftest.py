@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Ink is run as scripts from its folder, so its modules are imported the same way by the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
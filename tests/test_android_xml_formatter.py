@@ -0,0 +1,68 @@
+"""
+Golden files of `serialize_android_strings_xml`.
+
+Each folder of `android_xml_formatter` holds an `input.xml` and the `expected.xml` written when importing it. The expected
+files are the output of the formatter this one replaced (indent, then `ElementTree.write`, then the missing last line break
+and the header added back) so any change of the output shows up here.
+
+`trailing_blank_line` is the one case that intentionally differs from that formatter: a blank line after the last tag used
+to leave the closing `</resources>` tag indented by 4 spaces, it's now written at the start of its line.
+"""
+
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from utils.android_xml_formatter import serialize_android_strings_xml, write_android_strings_xml
+
+golden_folder = os.path.join(os.path.dirname(__file__), "android_xml_formatter")
+
+
+@pytest.fixture(autouse=True)
+def android_namespaces():
+    # Same prefixes as `loco_updater.register_android_xml_namespaces`
+    ET.register_namespace('android', 'http://schemas.android.com/apk/res/android')
+    ET.register_namespace('tools', 'http://schemas.android.com/tools')
+    ET.register_namespace('app', 'http://schemas.android.com/apk/res-auto')
+
+
+def read_header(path):
+    """Text before the `<resources>` tag, like `loco_updater.read_header`, or None when there is none"""
+    header_lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("<resources"):
+                break
+            header_lines.append(line)
+
+    return "".join(header_lines).removesuffix("\n") or None
+
+
+@pytest.mark.parametrize("case", sorted(os.listdir(golden_folder)))
+def test_serialized_strings_match_golden_file(case):
+    input_path = os.path.join(golden_folder, case, "input.xml")
+    with open(os.path.join(golden_folder, case, "expected.xml"), "rb") as f:
+        expected = f.read()
+
+    root = ET.parse(input_path).getroot()
+
+    assert serialize_android_strings_xml(root, read_header(input_path)) == expected
+
+
+def test_written_file_matches_golden_file(tmp_path):
+    input_path = os.path.join(golden_folder, "header", "input.xml")
+    with open(os.path.join(golden_folder, "header", "expected.xml"), "rb") as f:
+        expected = f.read()
+
+    write_android_strings_xml(ET.parse(input_path).getroot(), tmp_path / "strings.xml", read_header(input_path))
+
+    assert (tmp_path / "strings.xml").read_bytes() == expected
+
+
+def test_serializing_twice_gives_the_same_content():
+    input_path = os.path.join(golden_folder, "blank_lines", "input.xml")
+    root = ET.parse(input_path).getroot()
+    first = serialize_android_strings_xml(root)
+
+    assert serialize_android_strings_xml(ET.fromstring(first)) == first
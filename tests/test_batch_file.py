@@ -0,0 +1,31 @@
+import pytest
+
+from translate.batch_file import BatchFileError, BatchItem, read_batch_file
+
+
+def read(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return read_batch_file(str(path))
+
+
+def test_mapping_form_of_yaml(tmp_path):
+    items = read(tmp_path, "keys.yml", "sentFilesTitle:\n  context: Title\n  tags: android, ios\n  seeds: {en: Sent files}\n")
+
+    assert items == [BatchItem("sentFilesTitle", {"en": "Sent files"}, "Title", ["android", "ios"])]
+
+
+@pytest.mark.parametrize("name, content, error", [
+    ("keys.yml", "first:\n  seeds: {en: First}\nsecond: Second\n", "Item 2 is not a mapping"),
+    ("keys.yml", "first:\n  - en\n", "Item 1 is not a mapping"),
+    ("keys.yml", "Just a text\n", "Expected a list of items"),
+    ("keys.yml", "- key: first\n  context: [a, b]\n", "Context of item 1"),
+    ("keys.yml", "- key: first\n  seeds: {en: 42}\n", "Seed 'en' of item 1"),
+    ("keys.yml", "- key: first\n  seeds: {en: {one: [a]}}\n", "Seed 'en' of item 1"),
+    ("keys.yml", "- key: first\n  tags: 3\n", "Tags of item 1"),
+    ("keys.jsonl", '{"key": "first"}\n{"key": "second", "context": 3}\n', "Context of item 2"),
+    ("keys.jsonl", '["second"]\n', "Item 1 is not a mapping"),
+])
+def test_malformed_items_are_reported_with_their_index(tmp_path, name, content, error):
+    with pytest.raises(BatchFileError, match=error):
+        read(tmp_path, name, content)
@@ -0,0 +1,29 @@
+import os
+import pickle
+
+import pytest
+
+import config
+
+
+@pytest.fixture
+def settings_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "script_folder", str(tmp_path))
+    monkeypatch.setattr(config, "config_file", str(tmp_path / "settings.yml"))
+    monkeypatch.setattr(config, "settings_cache_file", str(tmp_path / "settings_cache"))
+    (tmp_path / "settings.yml").write_text("global:\n  spinner:\n    type: dots\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize("corrupt_cache", [b"", b"not a pickle", pickle.dumps(None), pickle.dumps((1, 2, 3))])
+def test_corrupt_cache_is_parsed_again(settings_folder, corrupt_cache):
+    (settings_folder / "settings_cache").write_bytes(corrupt_cache)
+
+    assert config.load_settings() == {"global": {"spinner": {"type": "dots"}}}
+    assert config.load_settings() == {"global": {"spinner": {"type": "dots"}}}  # From the rewritten cache
+
+
+def test_unpicklable_settings_are_not_cached(settings_folder):
+    config._write_settings_cache((0, 0), {"global": lambda: None})
+
+    assert os.listdir(settings_folder) == ["settings.yml"]
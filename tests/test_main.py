@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ink_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+heavy_modules = ["loco_updater", "requests", "yaml", "inquirer", "translate.translate_command"]
+
+# Run in a fresh interpreter so modules imported by other tests don't hide an eager import
+list_imported_heavy_modules = """
+import json
+import sys
+
+import main
+
+parser = main.LazyArgumentParser()
+main.define_commands(parser)
+parser.parse_args(sys.argv[1:])
+print(json.dumps([module for module in {heavy_modules} if module in sys.modules]))
+"""
+
+
+@pytest.mark.parametrize("command", [["color", "toggle"], ["project"]])
+def test_parsing_a_command_does_not_import_heavy_modules(command):
+    result = subprocess.run(
+        [sys.executable, "-c", list_imported_heavy_modules.format(heavy_modules=heavy_modules), *command],
+        capture_output=True, text=True, check=True, cwd=ink_folder
+    )
+
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+@pytest.mark.parametrize("jobs", ["0", "-3"])
+def test_jobs_must_be_positive(jobs, capsys):
+    import main
+
+    parser = main.LazyArgumentParser()
+    main.define_commands(parser)
+
+    with pytest.raises(SystemExit):
+        parser.parse_args(["loco", f"--jobs={jobs}"])
+    assert "--jobs" in capsys.readouterr().err
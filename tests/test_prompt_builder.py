@@ -0,0 +1,61 @@
+from translate.prompt_builder import construct_batch_retry_prompts, construct_prompt, construct_retry_prompt
+
+failure = "  - de: no translation generated\n  - it: missing quantity `other`"
+
+
+def test_retry_prompt_only_asks_again_for_the_failed_languages():
+    prompt = construct_retry_prompt({"en": "Hello"}, {"fr": "Bonjour"}, ["en", "fr", "de", "it"], None, failure)
+
+    assert "en: Hello" in prompt
+    assert "fr: Bonjour" in prompt
+    assert failure in prompt
+    assert "Generate translations for these languages only: de, it" in prompt
+
+
+def test_retry_prompt_is_shorter_than_the_first_prompt():
+    seeds = {"en": "Hello"}
+    languages = ["en", "fr", "de", "it"]
+
+    retry_prompt = construct_retry_prompt(seeds, {"fr": "Bonjour"}, languages, None, failure)
+
+    assert len(retry_prompt) < len(construct_prompt(seeds, languages, None))
+
+
+def test_plural_retry_prompt_gives_quantities():
+    seeds = {"en": {"one": "%d file", "other": "%d files"}}
+    accepted = {"fr": {"one": "%d fichier", "other": "%d fichiers"}}
+
+    prompt = construct_retry_prompt(seeds, accepted, ["en", "fr", "pl"], None, "  - pl: missing quantity `few`")
+
+    assert "fr-other: %d fichiers" in prompt
+    assert "Generate translations for these languages only: pl" in prompt
+    assert "`<code>-<quantity>: <translation>`" in prompt
+
+
+def test_batch_retry_prompts_give_each_key_its_section():
+    requests = [
+        ("first", {"en": "One"}, "A counter", [], {"fr": "Un"}, "  - de: no translation generated"),
+        ("second", {"en": "Two"}, None, [("Two", {"de": "Zwei"})], {},
+         "  - fr: no translation generated\n  - de: no translation generated"),
+    ]
+
+    [(keys, prompt)] = construct_batch_retry_prompts(requests, ["en", "fr", "de"])
+
+    assert keys == ["first", "second"]
+    first_section, second_section = prompt.split("[first]")[1].split("[second]")
+    assert "Generate translations for these languages only: de" in first_section
+    assert "A counter" in first_section
+    assert "Generate translations for these languages only: fr, de" in second_section
+    assert '- "Two" -> de: Zwei' in second_section
+
+
+def test_retry_prompt_keeps_the_guidance_and_suggestions_of_the_first_prompt():
+    suggestions = [("Transfer sent", {"fr": "Transfert envoyé", "de": "Transfer gesendet"})]
+
+    prompt = construct_retry_prompt({"en": "Transfer"}, {"fr": "Transfert"}, ["en", "fr", "de"], None,
+                                    "  - de: no translation generated", suggestions)
+
+    assert "as a file transfer" in prompt
+    assert '- "Transfer sent" -> de: Transfer gesendet' in prompt
+    # Each retry is sent on its own, without the earlier conversation
+    assert "previous" not in prompt
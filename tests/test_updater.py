@@ -0,0 +1,49 @@
+import subprocess
+from datetime import datetime, timedelta
+
+import pytest
+
+import updater
+
+
+@pytest.fixture
+def spawned_refreshes(tmp_path, monkeypatch):
+    """Commands of the background refreshes started, none of them actually run"""
+    spawned = []
+    monkeypatch.setattr(updater, "cache_file", str(tmp_path / "updater_cache"))
+    monkeypatch.setattr(updater, "does_current_branch_target_main", lambda: True)
+    monkeypatch.setattr(updater, "get_current_branch_hash", lambda: "current")
+    monkeypatch.setattr(subprocess, "Popen", lambda cmd, **kwargs: spawned.append(cmd))
+    return spawned
+
+
+def test_first_check_starts_a_single_refresh(spawned_refreshes):
+    updater.check_for_updates("color toggle")
+    updater.check_for_updates("color toggle")
+
+    assert len(spawned_refreshes) == 1
+    assert not updater.is_cache_outdated()
+    assert updater.read_cached_remote_hash() == ""
+
+
+def test_failed_fetch_is_not_retried_the_same_day(spawned_refreshes, monkeypatch, capsys):
+    monkeypatch.setattr(subprocess, "run", lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 128))
+
+    updater.check_for_updates("color toggle")
+    updater.refresh_remote_main_hash()
+    updater.check_for_updates("color toggle")
+
+    assert len(spawned_refreshes) == 1
+    assert "new version" not in capsys.readouterr().out
+
+
+def test_check_of_a_previous_day_keeps_the_known_hash(spawned_refreshes, monkeypatch, capsys):
+    monkeypatch.setattr(updater.random, "randint", lambda a, b: b)  # The plain message, not the rainbow one
+    with open(updater.cache_file, "w") as fd:
+        fd.write((datetime.now() - timedelta(days=1)).isoformat() + "\n" + "latest")
+
+    updater.check_for_updates("color toggle")
+
+    assert len(spawned_refreshes) == 1
+    assert updater.read_cached_remote_hash() == "latest"
+    assert "A new version of Ink is available!" in capsys.readouterr().out
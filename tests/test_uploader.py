@@ -0,0 +1,64 @@
+import time
+
+import pytest
+import requests
+
+import loco_cache
+from loco_cache import LocoAssetIndex
+from translate import uploader
+
+api_key = "api-key"
+
+
+class FakeResponse:
+    def __init__(self, status_code, json=None):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+@pytest.fixture
+def requested_urls(tmp_path, monkeypatch):
+    """Urls asked to Loco, which knows the `existingKey` and `otherKey` assets"""
+    urls = []
+
+    def get(url, **kwargs):
+        urls.append(url)
+        if url == uploader._LOCO_ASSETS_URL:
+            return FakeResponse(200, [{"id": "existingKey"}, {"id": "otherKey"}])
+        return FakeResponse(200 if url.endswith("/existingKey") else 404)
+
+    monkeypatch.setattr(loco_cache, "asset_indexes_folder", str(tmp_path))
+    monkeypatch.setattr(requests, "get", get)
+    return urls
+
+
+def test_recent_index_answers_without_any_request(requested_urls):
+    LocoAssetIndex(api_key).replace(["existingKey"])
+
+    assert uploader.is_key_already_present("existingKey", api_key)
+    assert not uploader.is_key_already_present("newKey", api_key)
+    assert uploader.find_similar_keys("existingKeys", api_key) == ["existingKey"]
+    assert requested_urls == []
+
+
+def test_single_key_is_asked_on_its_own_when_index_is_outdated(requested_urls):
+    assert not uploader.is_key_already_present("newKey", api_key)
+    assert uploader.find_similar_keys("existingKeys", api_key) == []
+    assert requested_urls == [f"{uploader._LOCO_ASSETS_URL}/newKey"]
+
+
+def test_batch_lists_assets_once_when_index_is_outdated(requested_urls, monkeypatch):
+    index = LocoAssetIndex(api_key)
+    index.replace(["existingKey"])
+    monkeypatch.setattr(time, "time", lambda: index.listed_at + uploader.asset_index_max_age + 1)
+
+    assert uploader.find_present_keys(["otherKey", "newKey"], api_key) == {"otherKey"}
+    assert uploader.find_present_keys(["newKey"], api_key) == set()
+    assert requested_urls == [uploader._LOCO_ASSETS_URL]
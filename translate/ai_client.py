@@ -1,22 +1,61 @@
-"""Pluggable AI client used to generate translations."""
-from typing import Any
+"""Pluggable AI client used to generate translations.
+
+Completions are streamed so callers can show each line of the response as
+soon as it is generated, and several prompts can be sent at the same time
+over a pooled session with `generate_translations_concurrently`.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 
 import requests
 
 import config
 
+# Maximum amount of completions requested at the same time, unless `loco.translation_max_concurrency` is set
+default_max_concurrency = 4
+# Seconds to connect, then seconds without receiving anything from the stream before giving up
+request_timeout = (10, 300)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+LineCallback = Callable[[str], None]
+
 
-def generate_translations(prompt: str) -> str:
+def generate_translations(prompt: str, on_line: Optional[LineCallback] = None) -> str:
     """Send the prompt to the AI provider and return its raw text response.
 
-    Replace this stub with the actual provider call (HTTP request, SDK, ...).
-    Until then, raises so callers can't silently get an empty result.
+    `on_line` is called with each line of the response as soon as it has been
+    completely generated, before the whole response is available.
     """
     return _translate_using_openai(prompt, endpoint=config.get_global("loco", "translation_endpoint"),
-                                   bearer_token=config.get_global("loco", "translation_api_key"))
+                                   bearer_token=config.get_global("loco", "translation_api_key"), on_line=on_line)
 
 
-def _translate_using_openai(prompt: str, endpoint: str, bearer_token: str) -> Any:
+def generate_translations_concurrently(prompts: List[str], on_line: Optional[Callable[[int, str], None]] = None) -> List[str]:
+    """Send every prompt, at most `get_max_concurrency()` at a time, and return their responses in the same order.
+
+    `on_line` is called with the index of the prompt and each line of its
+    response as they arrive, from the thread waiting for that response.
+    """
+    if not prompts:
+        return []
+
+    def generate(index: int) -> str:
+        line_callback = (lambda line: on_line(index, line)) if on_line else None
+        return generate_translations(prompts[index], on_line=line_callback)
+
+    with ThreadPoolExecutor(max_workers=min(get_max_concurrency(), len(prompts))) as executor:
+        return list(executor.map(generate, range(len(prompts))))
+
+
+def get_max_concurrency() -> int:
+    return config.get_global("loco", "translation_max_concurrency", raise_error=False) or default_max_concurrency
+
+
+def _translate_using_openai(prompt: str, endpoint: str, bearer_token: str, on_line: Optional[LineCallback] = None) -> str:
     url = endpoint + "/v1/chat/completions"
     headers = {
         "Authorization": "Bearer " + bearer_token,
@@ -29,9 +68,63 @@ def _translate_using_openai(prompt: str, endpoint: str, bearer_token: str) -> An
                 "role": "user",
                 "content": prompt
             }
-        ]
+        ],
+        "stream": True,
     }
-    response = requests.post(url, headers=headers, json=payload, timeout=300)  # 5 min timeout
-    response.raise_for_status()  # Raise error if http error occurred
+    with _get_session().post(url, headers=headers, json=payload, stream=True, timeout=request_timeout) as response:
+        response.raise_for_status()  # Raise error if http error occurred
+
+        # Providers that don't support streaming answer with the whole completion at once
+        if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            content = response.json()["choices"][0]["message"]["content"]
+            for line in content.splitlines():
+                _notify(on_line, line)
+            return content
+
+        return _read_event_stream(response, on_line)
+
+
+def _read_event_stream(response: requests.Response, on_line: Optional[LineCallback]) -> str:
+    """Reads the server-sent events of a streamed completion, calling `on_line` each time a line is complete."""
+    chunks = []
+    pending_line = ""
+
+    for event_line in response.iter_lines():
+        if not event_line.startswith(b"data:"):
+            continue
+
+        data = event_line[len(b"data:"):].strip()
+        if data == b"[DONE]":
+            break
+
+        choices = json.loads(data).get("choices") or []
+        content = (choices[0].get("delta") or {}).get("content") if choices else None
+        if not content:
+            continue
+
+        chunks.append(content)
+        *complete_lines, pending_line = (pending_line + content).split("\n")
+        for line in complete_lines:
+            _notify(on_line, line)
+
+    if pending_line:
+        _notify(on_line, pending_line)
+
+    return "".join(chunks)
+
+
+def _notify(on_line: Optional[LineCallback], line: str) -> None:
+    if on_line is not None:
+        on_line(line)
+
 
-    return response.json()["choices"][0]["message"]["content"]
+def _get_session() -> requests.Session:
+    """Returns the session shared by every completion so connections to the provider are reused."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(get_max_concurrency(), default_max_concurrency))
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+    return _http_session
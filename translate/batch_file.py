@@ -0,0 +1,142 @@
+"""Read the keys to translate in bulk with `ink translate --from-file`.
+
+Three formats are accepted, picked from the file extension:
+
+  * YAML (`.yml`, `.yaml`) — a list of items, or a mapping of key -> item.
+  * JSONL (`.jsonl`)       — one item per line.
+  * CSV (`.csv`)           — one key per row with `key`, `context` and `tags`
+                             columns, a `<code>` column per singular seed and a
+                             `<code>-<quantity>` column per plural seed.
+
+An item looks like:
+
+    key: sentFilesTitle
+    context: Title of the list of files sent by the user
+    tags: [android, ios]
+    seeds:
+      en: Sent files
+      fr: Fichiers envoyés
+      pl: {one: ..., few: ..., many: ..., other: ...}
+
+Only the shape of the file is checked here, the seeds themselves are verified
+with the same rules as the ones given on the command line.
+"""
+
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+import yaml
+
+SeedValue = Union[str, Dict[str, str]]
+
+
+class BatchFileError(ValueError):
+    """Raised when the batch file can't be read or an item is malformed."""
+
+
+@dataclass
+class BatchItem:
+    key: str
+    seeds: Dict[str, SeedValue] = field(default_factory=dict)
+    context: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+
+
+def read_batch_file(path: str) -> List[BatchItem]:
+    extension = os.path.splitext(path)[1].lower()
+
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if extension in (".yml", ".yaml"):
+                raw_items = _read_yaml(f)
+            elif extension == ".jsonl":
+                raw_items = _read_jsonl(f)
+            elif extension == ".csv":
+                raw_items = _read_csv(f)
+            else:
+                raise BatchFileError(f"Unsupported file extension '{extension}', expected .yml, .yaml, .jsonl or .csv")
+    except OSError as exception:
+        raise BatchFileError(f"Could not read {path}: {exception}") from exception
+    except (yaml.YAMLError, json.JSONDecodeError, csv.Error) as exception:
+        raise BatchFileError(f"Could not parse {path}: {exception}") from exception
+
+    return [_to_batch_item(raw_item, index) for index, raw_item in enumerate(raw_items, start=1)]
+
+
+def _read_yaml(f) -> list:
+    content = yaml.safe_load(f) or []
+    if isinstance(content, dict):
+        # Mapping form: `sentFilesTitle: {seeds: ..., tags: ...}`
+        items = []
+        for index, (key, item) in enumerate(content.items(), start=1):
+            if item is not None and not isinstance(item, dict):
+                raise BatchFileError(f"Item {index} is not a mapping")
+            items.append({"key": key, **(item or {})})
+        return items
+    if not isinstance(content, list):
+        raise BatchFileError("Expected a list of items or a mapping of key -> item")
+    return content
+
+
+def _read_jsonl(f) -> list:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def _read_csv(f) -> list:
+    items = []
+    for row in csv.DictReader(f):
+        item = {"key": row.pop("key", None), "context": row.pop("context", None) or None, "seeds": {}}
+
+        tags = row.pop("tags", None)
+        if tags:
+            item["tags"] = [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+        for column, value in row.items():
+            if column is None or not value:  # Extra cells without header, or seeds left empty for this key
+                continue
+            code, _, quantity = column.strip().partition("-")
+            if quantity:
+                item["seeds"].setdefault(code, {})[quantity] = value
+            else:
+                item["seeds"][code] = value
+
+        items.append(item)
+    return items
+
+
+def _to_batch_item(raw_item, index: int) -> BatchItem:
+    if not isinstance(raw_item, dict):
+        raise BatchFileError(f"Item {index} is not a mapping")
+
+    key = raw_item.get("key")
+    if not isinstance(key, str) or not key.strip():
+        raise BatchFileError(f"Item {index} has no key")
+
+    seeds = raw_item.get("seeds") or {}
+    if not isinstance(seeds, dict):
+        raise BatchFileError(f"Seeds of item {index} must be a mapping of language code -> value")
+
+    for code, value in seeds.items():
+        if not _is_seed_value(value):
+            raise BatchFileError(f"Seed '{code}' of item {index} must be a text, or a mapping of quantity -> text")
+
+    context = raw_item.get("context")
+    if context is not None and not isinstance(context, str):
+        raise BatchFileError(f"Context of item {index} must be a text")
+
+    tags = raw_item.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise BatchFileError(f"Tags of item {index} must be a list of texts, or a comma separated text")
+
+    return BatchItem(key=key.strip(), seeds=seeds, context=context, tags=tags)
+
+
+def _is_seed_value(value) -> bool:
+    if isinstance(value, dict):
+        return all(isinstance(quantity, str) and isinstance(text, str) for quantity, text in value.items())
+    return isinstance(value, str)
@@ -4,10 +4,13 @@ The expected line format is `<code>: <value>` for singular and
 `<code>-<quantity>: <value>` for plural. For robustness, lines using
 `<code>.<quantity>: <value>` are also accepted as a fallback when a model
 emits the dotted form.
+
+Responses to batch prompts group these lines under a `[<key>]` header line
+per key, see `parse_batch_response`.
 """
 
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from translate.languages import allowed_quantities
 from translate.translation import LocaleEntry, Translations
@@ -25,12 +28,17 @@ _LINE_PATTERN = re.compile(
     re.VERBOSE,
 )
 
+# Header of the section of a key in the response to a batch prompt, e.g. `[sentFilesTitle]`
+_KEY_HEADER_PATTERN = re.compile(r"^\s*(?:\*\*)?\[(?P<key>[^\]\s]+)\](?:\*\*)?\s*:?\s*$")
+
 
-def parse_response(response_text: str, languages: List[str]) -> Translations:
+def parse_response(response_text: str, languages: List[str], plural_mode: Optional[bool] = None) -> Translations:
     """Parse the AI response into a `Translations` object.
 
     Only lines whose language code is in `languages` are kept. Trailing or
     leading blank lines, code fences and stray prose are silently skipped.
+    When `plural_mode` is given, lines of the other mode are skipped too, so
+    the languages the model got wrong are simply missing from the result.
     """
     accepted_codes = set(languages)
     singular_entries: Dict[str, str] = {}
@@ -60,6 +68,11 @@ def parse_response(response_text: str, languages: List[str]) -> Translations:
         else:
             plural_entries.setdefault(code, {})[quantity] = value
 
+    if plural_mode is True:
+        singular_entries = {}
+    elif plural_mode is False:
+        plural_entries = {}
+
     entries = {}
     for code, value in singular_entries.items():
         entries[code] = LocaleEntry(singular=value)
@@ -71,3 +84,31 @@ def parse_response(response_text: str, languages: List[str]) -> Translations:
             entries[code] = LocaleEntry(plurals=filtered)
 
     return Translations(entries=entries)
+
+
+def parse_batch_response(response_text: str, keys: List[str], languages: List[str],
+                         plural_mode_per_key: Optional[Dict[str, bool]] = None) -> Dict[str, Translations]:
+    """Parse the AI response to a batch prompt into one `Translations` per key.
+
+    Lines are attributed to the last `[<key>]` header seen before them. Unknown
+    keys and lines before the first header are skipped, keys the model left out
+    are simply absent from the result.
+    """
+    accepted_keys = set(keys)
+    lines_per_key: Dict[str, List[str]] = {}
+    current_key = None
+
+    for line in response_text.splitlines():
+        header = _KEY_HEADER_PATTERN.match(line)
+        if header is not None:
+            current_key = header.group("key") if header.group("key") in accepted_keys else None
+            continue
+
+        if current_key is not None:
+            lines_per_key.setdefault(current_key, []).append(line)
+
+    plural_mode_per_key = plural_mode_per_key or {}
+    return {
+        key: parse_response("\n".join(lines), languages, plural_mode_per_key.get(key))
+        for key, lines in lines_per_key.items()
+    }
@@ -1,10 +1,59 @@
 """Build the prompt sent to the AI client for translation generation."""
 
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from translate.languages import allowed_quantities
 
 SeedValue = Union[str, Dict[str, str]]
+# Source text and translations of an entry of the translation memory
+Suggestion = Tuple[str, Dict[str, SeedValue]]
+
+# Key, seeds, optional context and suggestions from the translation memory of a key to translate in a batch
+BatchRequest = Tuple[str, Dict[str, SeedValue], Optional[str], List[Suggestion]]
+
+# Same as `BatchRequest`, with the translations accepted so far and why the other ones failed, of a key to translate again
+RetryRequest = Tuple[str, Dict[str, SeedValue], Optional[str], List[Suggestion], Dict[str, SeedValue], str]
+
+# Estimated tokens a batch prompt can use, instructions included, before the next keys go to another prompt
+DEFAULT_PROMPT_TOKEN_BUDGET = 4000
+
+# Bump when the wording of the prompts changes, translations remembered for a previous version are then generated again
+PROMPT_VERSION = 1
+
+_INSTRUCTIONS = [
+    "You are a professional translator working on a mobile application.",
+    "Translate the provided source text(s) into the requested target languages.",
+    "Preserve placeholders (e.g. %s, %1$d, {n}, %@), punctuation style, and tone.",
+    "Do not add explanations, do not wrap the output in code fences, output only the requested lines.",
+    "",
+    "Always aim for the european versions of each language when applicable.",
+    "Always aim for swiss german when translating for german when applicable.",
+    "Use the most natural wording for these specific variants so they don't feel foreign when reading.",
+    "",
+    "When translating 'transfer' / 'transfert' take it as a file transfer not a money transfer unless otherwise indicated.",
+    "",
+]
+
+_BATCH_INSTRUCTIONS = _INSTRUCTIONS + [
+    "Several strings have to be translated. Each one starts with its id between square brackets, followed by its "
+    "provided translations (use these as the source of truth) and the languages to generate.",
+    "For each string, output its id between square brackets on its own line, then only its requested lines.",
+]
+
+# Follow-up prompts only ask for the languages still missing, so they keep the instructions short. Each prompt is sent on
+# its own, so they must not refer to an earlier answer
+_RETRY_INSTRUCTIONS = [
+    "You are a professional translator working on a mobile application.",
+    "Translate the provided source text into the requested target languages.",
+    "Preserve placeholders (e.g. %s, %1$d, {n}, %@), punctuation style, and tone.",
+    "Output only the requested lines, without explanations or code fences.",
+    "Aim for the european version of each language and for swiss german when applicable.",
+    "Take 'transfer' / 'transfert' as a file transfer, not a money transfer, unless otherwise indicated.",
+]
+
+_BATCH_RETRY_INSTRUCTIONS = _RETRY_INSTRUCTIONS + [
+    "For each string, output its id between square brackets on its own line, then only its requested lines.",
+]
 
 
 def is_plural_mode(seeds: Dict[str, SeedValue]) -> bool:
@@ -19,50 +68,18 @@ def is_plural_mode(seeds: Dict[str, SeedValue]) -> bool:
     return isinstance(sample, dict)
 
 
-def construct_prompt(seeds: Dict[str, SeedValue], languages: List[str], prompt_context: Union[str, None]) -> str:
+def construct_prompt(seeds: Dict[str, SeedValue], languages: List[str], prompt_context: Union[str, None],
+                     suggestions: Optional[List[Suggestion]] = None) -> str:
     """Construct the AI prompt asking for the missing translations.
 
     The output format the model is asked to follow uses the `<code>-<quantity>`
     style for plurals (e.g. `fr-other`) which mirrors what the loco updater
     uses internally for plural keys.
     """
-    plural_mode = is_plural_mode(seeds)
-    missing = [lang for lang in languages if lang not in seeds]
-
-    lines = [
-        "You are a professional translator working on a mobile application.",
-        "Translate the provided source text(s) into the requested target languages.",
-        "Preserve placeholders (e.g. %s, %1$d, {n}, %@), punctuation style, and tone.",
-        "Do not add explanations, do not wrap the output in code fences, output only the requested lines.",
-        "",
-        "Always aim for the european versions of each language when applicable.",
-        "Always aim for swiss german when translating for german when applicable.",
-        "Use the most natural wording for these specific variants so they don't feel foreign when reading.",
-        "",
-        "When translating 'transfer' / 'transfert' take it as a file transfer not a money transfer unless otherwise indicated.",
-        "",
-        "Provided translations (use these as the source of truth):",
-    ]
-
-    if plural_mode:
-        for lang, plurals in seeds.items():
-            for quantity in allowed_quantities(lang):
-                if quantity in plurals:
-                    lines.append(f"{lang}-{quantity}: {plurals[quantity]}")
-        lines.append("")
-        lines.append(f"Generate translations for these languages: {', '.join(missing)}")
-        lines.append(
-            "Output one line per language and quantity in the format `<code>-<quantity>: <translation>`."
-        )
-        lines.append(
-            "Use quantities `one, other` for all languages except `pl` which uses `one, few, many, other`."
-        )
-    else:
-        for lang, value in seeds.items():
-            lines.append(f"{lang}: {value}")
-        lines.append("")
-        lines.append(f"Generate translations for these languages: {', '.join(missing)}")
-        lines.append("Output one line per language in the format `<code>: <translation>`.")
+    lines = list(_INSTRUCTIONS)
+    lines.append("Provided translations (use these as the source of truth):")
+    lines.extend(_build_key_request(seeds, languages))
+    lines.extend(_build_suggestions(suggestions, languages))
 
     if prompt_context:
         lines.append("")
@@ -72,3 +89,151 @@ def construct_prompt(seeds: Dict[str, SeedValue], languages: List[str], prompt_c
         lines.append(prompt_context)
 
     return "\n".join(lines)
+
+
+def construct_batch_prompts(requests: List[BatchRequest], languages: List[str],
+                            token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> List[Tuple[List[str], str]]:
+    """Construct as few AI prompts as possible asking for the missing translations of several keys.
+
+    Keys keep their order and are packed behind a single copy of the
+    instructions until a prompt would exceed `token_budget` estimated tokens.
+    A key too large for the budget on its own gets a prompt of its own.
+    Each key gets its own `[<key>]` section, which the model is asked to
+    repeat in its output so `extractor.parse_batch_response` can tell the
+    translations of each key apart. Returns the keys of each prompt along with
+    the prompt.
+    """
+    sections = [(request[0], _build_batch_section(request, languages)) for request in requests]
+    return _pack_sections(sections, _BATCH_INSTRUCTIONS, token_budget)
+
+
+def construct_retry_prompt(seeds: Dict[str, SeedValue], accepted: Dict[str, SeedValue], languages: List[str],
+                           prompt_context: Optional[str], failure: str,
+                           suggestions: Optional[List[Suggestion]] = None) -> str:
+    """Construct a short follow-up prompt asking only for the languages missing from `seeds` and `accepted`.
+
+    `accepted` holds the translations generated so far, given to the model so
+    the new ones stay consistent with them, and `failure` lists the issues
+    each language asked again must avoid.
+    """
+    section = _build_retry_section(seeds, accepted, languages, prompt_context, failure, suggestions)
+    return "\n".join(_RETRY_INSTRUCTIONS + section)
+
+
+def construct_batch_retry_prompts(requests: List[RetryRequest], languages: List[str],
+                                  token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET) -> List[Tuple[List[str], str]]:
+    """Same as `construct_retry_prompt` for several keys, packed like `construct_batch_prompts`."""
+    sections = [
+        (key, ["", f"[{key}]"] + _build_retry_section(seeds, accepted, languages, prompt_context, failure, suggestions))
+        for key, seeds, prompt_context, suggestions, accepted, failure in requests
+    ]
+    return _pack_sections(sections, _BATCH_RETRY_INSTRUCTIONS, token_budget)
+
+
+def _pack_sections(sections: List[Tuple[str, List[str]]], instructions: List[str],
+                   token_budget: int) -> List[Tuple[List[str], str]]:
+    """Packs the section of each key behind a single copy of the instructions until a prompt would exceed the budget."""
+    instruction_tokens = estimate_tokens("\n".join(instructions))
+    batches: List[Tuple[List[str], List[str]]] = []
+    batch_tokens = 0
+
+    for key, section in sections:
+        # Sections are joined by a line break, hence the extra character
+        section_tokens = estimate_tokens("\n".join(section) + "\n")
+
+        if not batches or batch_tokens + section_tokens > token_budget:
+            batches.append(([], list(instructions)))
+            batch_tokens = instruction_tokens
+
+        keys, lines = batches[-1]
+        keys.append(key)
+        lines.extend(section)
+        batch_tokens += section_tokens
+
+    return [(keys, "\n".join(lines)) for keys, lines in batches]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough amount of tokens of the text, about 4 characters per token, which is enough to size batches."""
+    return len(text) // 4 + 1
+
+
+def _build_batch_section(request: BatchRequest, languages: List[str]) -> List[str]:
+    key, seeds, prompt_context, suggestions = request
+    lines = ["", f"[{key}]"]
+    if prompt_context:
+        lines.append(f"Context given by the user, in its own language: {' '.join(prompt_context.split())}")
+    lines.extend(_build_key_request(seeds, languages))
+    lines.extend(_build_suggestions(suggestions, languages))
+    return lines
+
+
+def _build_key_request(seeds: Dict[str, SeedValue], languages: List[str]) -> List[str]:
+    """Lines giving the seeds of a key, the languages to generate and the expected output format."""
+    missing = [lang for lang in languages if lang not in seeds]
+    lines = _build_value_lines(seeds)
+    lines.append("")
+    lines.append(f"Generate translations for these languages: {', '.join(missing)}")
+    lines.extend(_build_output_format(is_plural_mode(seeds)))
+    return lines
+
+
+def _build_retry_section(seeds: Dict[str, SeedValue], accepted: Dict[str, SeedValue], languages: List[str],
+                         prompt_context: Optional[str], failure: str,
+                         suggestions: Optional[List[Suggestion]]) -> List[str]:
+    missing = [lang for lang in languages if lang not in seeds and lang not in accepted]
+    lines = ["Provided translations (use these as the source of truth):"]
+    lines.extend(_build_value_lines(seeds))
+    if accepted:
+        lines.append("Accepted translations, stay consistent with them:")
+        lines.extend(_build_value_lines(accepted))
+    if prompt_context:
+        lines.append(f"Context given by the user, in its own language: {' '.join(prompt_context.split())}")
+    lines.append(f"Generate translations for these languages only: {', '.join(missing)}")
+    lines.append("Avoid these issues:")
+    lines.append(failure)
+    lines.extend(_build_output_format(is_plural_mode(seeds)))
+    lines.extend(_build_suggestions(suggestions, missing))
+    return lines
+
+
+def _build_value_lines(translations: Dict[str, SeedValue]) -> List[str]:
+    """One `<code>: <translation>` line per language, or one `<code>-<quantity>: <translation>` line per quantity"""
+    lines = []
+    for lang, value in translations.items():
+        if isinstance(value, dict):
+            lines.extend(f"{lang}-{quantity}: {value[quantity]}" for quantity in allowed_quantities(lang) if quantity in value)
+        else:
+            lines.append(f"{lang}: {value}")
+    return lines
+
+
+def _build_output_format(plural_mode: bool) -> List[str]:
+    if plural_mode:
+        return [
+            "Output one line per language and quantity in the format `<code>-<quantity>: <translation>`.",
+            "Use quantities `one, other` for all languages except `pl` which uses `one, few, many, other`.",
+        ]
+    return ["Output one line per language in the format `<code>: <translation>`."]
+
+
+def _build_suggestions(suggestions: Optional[List[Suggestion]], languages: List[str]) -> List[str]:
+    """Lines giving the translations already approved for the same or similar source texts, if any."""
+    if not suggestions:
+        return []
+
+    lines = [
+        "",
+        "Translations already approved for similar texts in our apps, reuse their wording when it has the same meaning:",
+    ]
+    for source_text, translations in suggestions:
+        values = [f"{lang}: {_format_value(translations[lang])}" for lang in languages if lang in translations]
+        lines.append(f"- \"{source_text}\" -> {' | '.join(values)}")
+
+    return lines
+
+
+def _format_value(value: SeedValue) -> str:
+    if isinstance(value, dict):
+        return ", ".join(f"{quantity}={text}" for quantity, text in value.items())
+    return value
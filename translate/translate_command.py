@@ -1,16 +1,28 @@
 """Top-level orchestration for the `ink translate` command."""
+import itertools
 import sys
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import config
 from common_utils import select_in_list, cancel_ink_command
-from translate.ai_client import generate_translations
-from translate.extractor import parse_response
-from translate.languages import get_languages_for_project
-from translate.prompt_builder import construct_prompt, is_plural_mode
+from translate.ai_client import generate_translations, generate_translations_concurrently
+from translate.batch_file import BatchFileError, BatchItem, read_batch_file
+from translate.extractor import parse_batch_response, parse_response
+from translate.languages import allowed_quantities, get_languages_for_project
+from translate.prompt_builder import (
+    DEFAULT_PROMPT_TOKEN_BUDGET,
+    construct_batch_prompts,
+    construct_batch_retry_prompts,
+    construct_prompt,
+    construct_retry_prompt,
+    is_plural_mode,
+)
 from translate.spinner import Spinner
 from translate.translation import LocaleEntry, Translations
-from translate.uploader import upload_translations, is_key_already_present
+from translate.translation_memory import TranslationMemory
+from translate.uploader import (
+    upload_translations, upload_translations_batch, is_key_already_present, find_present_keys, find_similar_keys,
+)
 from translate.validation import (
     TranslationConsistencyError,
     verify_seed_consistency, has_single_locale,
@@ -18,6 +30,10 @@ from translate.validation import (
 
 SeedValue = Union[str, Dict[str, str]]
 
+# Prompts sent for a key, the first one included, before giving up on its missing languages, unless
+# `loco.translation_max_attempts` is set
+default_max_translation_attempts = 3
+
 
 def _seeds_to_translations(seeds: Dict[str, SeedValue]) -> Translations:
     entries = {}
@@ -29,6 +45,21 @@ def _seeds_to_translations(seeds: Dict[str, SeedValue]) -> Translations:
     return Translations(entries=entries)
 
 
+def _translations_to_seeds(translations: Translations) -> Dict[str, SeedValue]:
+    seeds: Dict[str, SeedValue] = {}
+    for lang, entry in translations.entries.items():
+        if entry.is_plural():
+            seeds[lang] = dict(entry.plurals)
+        else:
+            seeds[lang] = entry.singular
+    return seeds
+
+
+def _accepted_seeds(translations: Translations, seeds: Dict[str, SeedValue]) -> Dict[str, SeedValue]:
+    """The translations generated so far, without the seeds they were generated from"""
+    return {lang: value for lang, value in _translations_to_seeds(translations).items() if lang not in seeds}
+
+
 def _merge_translations(seeds: Translations, generated: Translations) -> Translations:
     merged = dict(seeds.entries)
     for lang, entry in generated.entries.items():
@@ -36,6 +67,47 @@ def _merge_translations(seeds: Translations, generated: Translations) -> Transla
     return Translations(entries=merged)
 
 
+def _split_generated_translations(generated: Translations, requested_languages: List[str]) -> Tuple[Translations, Dict[str, str]]:
+    """
+    Returns the generated translations of the requested languages that can be used, and why the other generated ones can't.
+
+    Each language is checked on its own, so a single bad line only costs that language. The generated translations are
+    expected to be parsed in the mode of the seeds, which leaves the quantities of plurals to check.
+    """
+    accepted = {}
+    rejections = {}
+    for lang, entry in generated.entries.items():
+        if lang not in requested_languages:
+            continue
+
+        if entry.is_plural():
+            missing_quantities = [quantity for quantity in allowed_quantities(lang) if quantity not in entry.plurals]
+            if missing_quantities:
+                rejections[lang] = f"missing quantities: {', '.join(missing_quantities)}"
+                continue
+
+        accepted[lang] = entry
+
+    return Translations(entries=accepted), rejections
+
+
+def _format_generation_failure(missing: List[str], rejections: Dict[str, str], indent: str = "  ") -> str:
+    reasons = [f"{lang}: {rejections.get(lang, 'no translation generated')}" for lang in missing]
+    return "\n".join(f"{indent}- {reason}" for reason in reasons)
+
+
+def get_max_translation_attempts() -> int:
+    return config.get_global("loco", "translation_max_attempts", raise_error=False) or default_max_translation_attempts
+
+
+def _show_generated_line(line: str, spinner: Spinner) -> None:
+    if not line.strip():
+        return
+
+    spinner.stop()  # Does nothing once the first line stopped it
+    print(f"  {line.strip()}")
+
+
 def prompt_for_confirmation(string_key: str, full: Translations, string_tags: List[str]) -> bool:
     print()
     for lang, entry in full.entries.items():
@@ -54,13 +126,29 @@ def format_locale_entry(entry: LocaleEntry) -> str:
         return entry.singular
 
 
+def _get_loco_api_key(args) -> str:
+    if args.core:
+        return config.get_global("loco", "core_key")
+    return config.get_project("loco", "loco_key")
+
+
+def _select_tags(message: str) -> List[str]:
+    choices = ["android, ios", "android", "custom tags…"]
+    tag_choice = select_in_list(message, choices)
+    if tag_choice == "custom tags…":
+        tag_choice = input("Input the coma separated tags (ex: android, ios, my kSuite): ")
+
+    return [el.strip() for el in tag_choice.split(",")]
+
+
 def run(args) -> None:
+    if getattr(args, "from_file", None):
+        run_from_file(args)
+        return
+
     languages = get_languages_for_project()
     seeds: Dict[str, SeedValue] = getattr(args, "seeds", None) or {}
-    if args.core:
-        loco_api_key = config.get_global("loco", "core_key")
-    else:
-        loco_api_key = config.get_project("loco", "loco_key")
+    loco_api_key = _get_loco_api_key(args)
 
     # Automatically read piped stdin as the translation from the API if they match the pattern
     if not sys.stdin.isatty():
@@ -118,71 +206,308 @@ def run(args) -> None:
         print("Key already exists, aborting to avoid overriding assets")
         raise SystemExit(1)
 
-    if len(string_tags) == 0:
-        choices = ["android, ios", "android", "custom tags…"]
-        tag_choice = select_in_list("Select tags for this string", choices)
-        if tag_choice == "custom tags…":
-            tag_choice = input("Input the coma separated tags (ex: android, ios, my kSuite): ")
+    similar_keys = find_similar_keys(string_key, loco_api_key)
+    if similar_keys:
+        print(f"Warning: Similar keys already exist, make sure this string is not a duplicate: {', '.join(similar_keys)}")
 
-        string_tags = [el.strip() for el in tag_choice.split(",")]
+    if len(string_tags) == 0:
+        string_tags = _select_tags("Select tags for this string")
 
     seeds_translations = _seeds_to_translations(seeds)
     missing = seeds_translations.missing_languages(languages)
 
-    response_text = None
-    if missing:
-        prompt = construct_prompt(seeds, languages, args.context)
-        spinner_style = config.get_global("spinner", "type", raise_error=False) or "random"
-        spinner = Spinner(spinner_style, "Generating translations…")
-        spinner.start()
-        response_text = generate_translations(prompt)
-        spinner.stop()
-        generated_translations = parse_response(response_text, languages)
-
-        # Re-verify the AI output using the same rules so a bad model response
-        # fails fast with a clear error.
-        generated_seeds: Dict[str, SeedValue] = {}
-        for lang, entry in generated_translations.entries.items():
-            if entry.is_plural():
-                generated_seeds[lang] = dict(entry.plurals)
-            else:
-                generated_seeds[lang] = entry.singular
-
-        if generated_seeds:
-            try:
-                verify_seed_consistency(generated_seeds)
-            except TranslationConsistencyError as exc:
-                print(f"AI response failed validation:\n{exc}")
-                raise SystemExit(1)
-
-        # Make sure the AI mode matches the seed mode (uniform mode invariant).
-        seed_is_plural = is_plural_mode(seeds)
-        if generated_seeds and is_plural_mode(generated_seeds) != seed_is_plural:
-            print(
-                "AI response mode (singular/plural) does not match the seed mode."
-            )
-            raise SystemExit(1)
+    translation_memory = TranslationMemory()
+    remembered = translation_memory.get(seeds, missing, args.context) if missing else None
 
-        full = _merge_translations(seeds_translations, generated_translations)
+    if remembered is not None:
+        print("Reusing the translations approved previously for the same text and context")
+        full = _merge_translations(seeds_translations, _seeds_to_translations(remembered))
+    elif missing:
+        full = _generate_translations(seeds, languages, args.context, translation_memory.find_suggestions(seeds))
     else:
         full = seeds_translations
 
-    still_missing = full.missing_languages(languages)
-    if still_missing:
-        print(
-            "\n"
-            "Translations are missing for the following languages after AI "
-            f"generation: {', '.join(still_missing)}"
-            "\n\n"
-            "AI ouput:"
-            f"{response_text}"
-        )
-        raise SystemExit(1)
-
     is_valid = prompt_for_confirmation(string_key, full, string_tags)
     if not is_valid:
         cancel_ink_command()
 
     upload_translations(string_key, full, string_tags, loco_api_key)
 
+    if missing:
+        translation_memory.store(seeds, missing, args.context, _translations_to_seeds(full))
+
     print(f"\nTranslations uploaded successfully")
+
+
+def _generate_translations(seeds: Dict[str, SeedValue], languages: List[str], context: Optional[str],
+                           suggestions) -> Translations:
+    """
+    Returns the seeds completed with the translations of every missing language. Languages the AI left out or got wrong are
+    asked again in a short follow-up prompt, giving the accepted translations and why the others failed, until they are all
+    valid or the attempts run out.
+    """
+    full = _seeds_to_translations(seeds)
+    rejections: Dict[str, str] = {}
+    response_text = ""
+    max_attempts = get_max_translation_attempts()
+
+    for attempt in range(1, max_attempts + 1):
+        missing = full.missing_languages(languages)
+        if attempt == 1:
+            prompt = construct_prompt(seeds, languages, context, suggestions)
+        else:
+            failure = _format_generation_failure(missing, rejections)
+            print(f"\nAsking again for {', '.join(missing)} (attempt {attempt}/{max_attempts}):\n{failure}")
+            prompt = construct_retry_prompt(seeds, _accepted_seeds(full, seeds), languages, context, failure, suggestions)
+
+        response_text = _generate_with_spinner(prompt)
+        generated, rejections = _split_generated_translations(
+            parse_response(response_text, languages, is_plural_mode(seeds)), missing)
+        full = _merge_translations(full, generated)
+        if not full.missing_languages(languages):
+            return full
+
+    still_missing = full.missing_languages(languages)
+    print(
+        "\n"
+        f"Translations are missing for the following languages after {max_attempts} AI generations:\n"
+        f"{_format_generation_failure(still_missing, rejections)}"
+        "\n\n"
+        "Last AI ouput:\n"
+        f"{response_text}"
+    )
+    raise SystemExit(1)
+
+
+def _generate_with_spinner(prompt: str) -> str:
+    spinner_style = config.get_global("spinner", "type", raise_error=False) or "random"
+    spinner = Spinner(spinner_style, "Generating translations…")
+    spinner.start()
+    try:
+        # The spinner only runs until the first line arrives, lines are then shown as they're generated
+        return generate_translations(prompt, on_line=lambda line: _show_generated_line(line, spinner))
+    finally:
+        spinner.stop()
+
+
+def run_from_file(args) -> None:
+    """Translate and upload every key of a batch file, with a single review for all of them.
+
+    Everything that can be checked is checked before the first AI call, so a
+    typo at the end of the file doesn't waste the translations of the keys
+    before it.
+    """
+    languages = get_languages_for_project()
+    loco_api_key = _get_loco_api_key(args)
+
+    try:
+        items = read_batch_file(args.from_file)
+    except BatchFileError as exc:
+        print(exc)
+        raise SystemExit(1)
+
+    if not items:
+        print(f"No keys found in {args.from_file}")
+        raise SystemExit(1)
+
+    errors = _validate_batch_items(items, languages)
+    if errors:
+        print("Invalid keys in the file:\n" + "\n".join(f"  - {error}" for error in errors))
+        raise SystemExit(1)
+
+    present_keys = find_present_keys([item.key for item in items], loco_api_key)
+    if present_keys:
+        print(f"These keys already exist, aborting to avoid overriding assets: {', '.join(sorted(present_keys))}")
+        raise SystemExit(1)
+
+    for item in items:
+        similar_keys = find_similar_keys(item.key, loco_api_key)
+        if similar_keys:
+            print(f"Warning: Keys similar to '{item.key}' already exist, make sure it's not a duplicate: "
+                  f"{', '.join(similar_keys)}")
+
+    single_locale_keys = [item.key for item in items if has_single_locale(item.seeds)]
+    if single_locale_keys:
+        prompt = (
+            f"\nOnly one locale was provided for {', '.join(single_locale_keys)}. This will reduce translation quality and "
+            "cause ambiguity for words with multiple meanings. Do you want to continue? [y/N]: "
+        )
+        should_continue = (input(prompt).lower() or "n") == "y"
+        if not should_continue:
+            raise SystemExit(1)
+
+    # Tags given on the command line apply to the keys that don't have their own
+    default_tags: List[str] = list(args.tags or [])
+    if not default_tags and any(not item.tags for item in items):
+        default_tags = _select_tags("Select tags for the keys of the file without tags")
+    for item in items:
+        item.tags = item.tags or default_tags
+
+    translation_memory = TranslationMemory()
+    full_per_key = _generate_batch_translations(items, languages, translation_memory)
+
+    is_valid = prompt_for_batch_confirmation(items, full_per_key)
+    if not is_valid:
+        cancel_ink_command()
+
+    # Keys sharing the same tags are uploaded together, with one import per language
+    translations_per_tags: Dict[tuple, Dict[str, Translations]] = {}
+    for item in items:
+        translations_per_tags.setdefault(tuple(item.tags), {})[item.key] = full_per_key[item.key]
+
+    for tags, translations_per_key in translations_per_tags.items():
+        upload_translations_batch(translations_per_key, list(tags), loco_api_key)
+
+    for item in items:
+        missing = [lang for lang in languages if lang not in item.seeds]
+        if missing:
+            translation_memory.store(item.seeds, missing, item.context, _translations_to_seeds(full_per_key[item.key]))
+
+    print(f"\n{len(items)} keys uploaded successfully")
+
+
+def _validate_batch_items(items: List[BatchItem], languages: List[str]) -> List[str]:
+    errors = []
+    seen_keys = set()
+
+    for item in items:
+        if item.key in seen_keys:
+            errors.append(f"{item.key}: the key is defined more than once")
+        seen_keys.add(item.key)
+
+        try:
+            verify_seed_consistency(item.seeds)
+        except TranslationConsistencyError as exc:
+            errors.append(f"{item.key}: {exc}")
+            continue
+
+        unknown = [lang for lang in item.seeds.keys() if lang not in languages]
+        if unknown:
+            errors.append(
+                f"{item.key}: some seed languages are not part of this project's language list "
+                f"({', '.join(languages)}): {', '.join(sorted(unknown))}"
+            )
+
+    return errors
+
+
+def _generate_batch_translations(items: List[BatchItem], languages: List[str],
+                                 translation_memory: TranslationMemory) -> Dict[str, Translations]:
+    """
+    Returns the complete translations of every key, reusing the ones remembered by the translation memory and asking the
+    AI for several of the other keys in each prompt. Keys left incomplete are asked again for their missing languages only.
+    """
+    full_per_key = {item.key: _seeds_to_translations(item.seeds) for item in items}
+    items_to_generate = []
+    remembered_count = 0
+    for item in items:
+        missing = full_per_key[item.key].missing_languages(languages)
+        if not missing:
+            continue
+
+        remembered = translation_memory.get(item.seeds, missing, item.context)
+        if remembered is not None:
+            full_per_key[item.key] = _merge_translations(full_per_key[item.key], _seeds_to_translations(remembered))
+            remembered_count += 1
+        else:
+            items_to_generate.append(item)
+
+    if remembered_count:
+        print(f"Reusing the translations approved previously for {remembered_count} keys")
+
+    if not items_to_generate:
+        return full_per_key
+
+    spinner_style = config.get_global("spinner", "type", raise_error=False) or "random"
+    # As many keys as the token budget allows are sent in each prompt
+    token_budget = (config.get_global("loco", "translation_prompt_token_budget", raise_error=False)
+                    or DEFAULT_PROMPT_TOKEN_BUDGET)
+    max_attempts = get_max_translation_attempts()
+    rejections_per_key: Dict[str, Dict[str, str]] = {}
+    suggestions_per_key = {item.key: translation_memory.find_suggestions(item.seeds) for item in items_to_generate}
+
+    for attempt in range(1, max_attempts + 1):
+        if attempt == 1:
+            requests = [(item.key, item.seeds, item.context, suggestions_per_key[item.key]) for item in items_to_generate]
+            batches = construct_batch_prompts(requests, languages, token_budget)
+            message = f"Generating translations for {len(items_to_generate)} keys…"
+        else:
+            print(f"\nAsking again for the missing languages of {len(items_to_generate)} keys "
+                  f"(attempt {attempt}/{max_attempts})")
+            retry_requests = [
+                (item.key, item.seeds, item.context, suggestions_per_key[item.key],
+                 _accepted_seeds(full_per_key[item.key], item.seeds),
+                 _format_generation_failure(full_per_key[item.key].missing_languages(languages),
+                                            rejections_per_key[item.key]))
+                for item in items_to_generate
+            ]
+            batches = construct_batch_retry_prompts(retry_requests, languages, token_budget)
+            message = f"Generating the missing translations of {len(items_to_generate)} keys…"
+
+        spinner = Spinner(spinner_style, message)
+        received_lines = itertools.count(1)
+
+        def show_progress(_, line):
+            if line.strip():
+                spinner.message = f"{message} {next(received_lines)} lines received"
+
+        items_per_key = {item.key: item for item in items_to_generate}
+        chunks = [[items_per_key[key] for key in keys] for keys, _ in batches]
+        prompts = [prompt for _, prompt in batches]
+
+        spinner.start()
+        try:
+            # Prompts are sent at the same time, their responses are then handled in the order of the file
+            responses = generate_translations_concurrently(prompts, on_line=show_progress)
+        finally:
+            spinner.stop()
+
+        for chunk, response_text in zip(chunks, responses):
+            generated_per_key = parse_batch_response(response_text, [item.key for item in chunk], languages,
+                                                     {item.key: is_plural_mode(item.seeds) for item in chunk})
+
+            for item in chunk:
+                missing = full_per_key[item.key].missing_languages(languages)
+                generated, rejections_per_key[item.key] = _split_generated_translations(
+                    generated_per_key.get(item.key, Translations()), missing)
+                full_per_key[item.key] = _merge_translations(full_per_key[item.key], generated)
+
+        # Only the keys that are still incomplete are asked again
+        items_to_generate = [item for item in items_to_generate if full_per_key[item.key].missing_languages(languages)]
+        if not items_to_generate:
+            return full_per_key
+
+    errors = [
+        f"  - {item.key}:\n" + _format_generation_failure(full_per_key[item.key].missing_languages(languages),
+                                                          rejections_per_key[item.key], indent="    ")
+        for item in items_to_generate
+    ]
+    print(f"\nSome keys could not be translated after {max_attempts} AI generations:\n" + "\n".join(errors))
+    raise SystemExit(1)
+
+
+def prompt_for_batch_confirmation(items: List[BatchItem], full_per_key: Dict[str, Translations]) -> bool:
+    """Shows every translation of every key in a single table before asking for one confirmation."""
+    rows = []
+    for item in items:
+        rows.append((item.key, "tags", ", ".join(item.tags)))
+        for lang, entry in full_per_key[item.key].entries.items():
+            if entry.is_plural():
+                rows.extend((item.key, f"{lang}-{quantity}", value) for quantity, value in entry.plurals.items())
+            else:
+                rows.append((item.key, lang, entry.singular))
+
+    key_width = max(len(row[0]) for row in rows)
+    language_width = max(len(row[1]) for row in rows)
+
+    print()
+    previous_key = None
+    for key, language, value in rows:
+        if previous_key is not None and key != previous_key:
+            print()
+        shown_key = key if key != previous_key else ""
+        print(f"{shown_key:<{key_width}}  {language:<{language_width}}  {value}")
+        previous_key = key
+    print()
+
+    return (input(f"Are the translations of these {len(items)} keys correct? [Y/n]: ").lower() or "y") == "y"
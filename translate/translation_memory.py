@@ -0,0 +1,121 @@
+"""Local translation memory of the translations approved with `ink translate`.
+
+Approved translations are stored in a SQLite database inside ink's folder.
+Each entry is keyed by the normalized seeds, the generated languages, the
+version of the prompt template and a hash of the context, so asking again
+for the same text in the same conditions reuses the approved translations
+without calling the AI. Entries whose source text is the same or close are
+also returned as suggestions to keep the wording consistent across apps.
+"""
+
+import difflib
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import config
+from translate.prompt_builder import PROMPT_VERSION
+
+SeedValue = Union[str, Dict[str, str]]
+
+database_path = config.script_folder + "/translation_memory.sqlite"
+
+# Minimum similarity (0 to 1) between two source texts for an entry to be suggested
+suggestion_cutoff = 0.8
+max_suggestions = 3
+
+
+class TranslationMemory:
+    def __init__(self, path: str = database_path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                cache_key TEXT PRIMARY KEY,
+                source_text TEXT NOT NULL,
+                translations TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS translations_source_text ON translations (source_text)")
+
+    def get(self, seeds: Dict[str, SeedValue], target_languages: List[str],
+            context: Optional[str]) -> Optional[Dict[str, SeedValue]]:
+        """Returns the translations previously approved for exactly these seeds, languages and context, if any."""
+        row = self.connection.execute(
+            "SELECT translations FROM translations WHERE cache_key = ?",
+            (_compute_cache_key(seeds, target_languages, context),),
+        ).fetchone()
+        if row is None:
+            return None
+
+        translations = json.loads(row[0])
+        if any(lang not in translations for lang in target_languages):
+            return None
+        return {lang: translations[lang] for lang in target_languages}
+
+    def store(self, seeds: Dict[str, SeedValue], target_languages: List[str], context: Optional[str],
+              translations: Dict[str, SeedValue]) -> None:
+        """Remembers the approved translations, seeds included, of the target languages."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO translations (cache_key, source_text, translations, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    _compute_cache_key(seeds, target_languages, context),
+                    get_source_text(seeds),
+                    json.dumps({**translations, **seeds}, ensure_ascii=False, sort_keys=True),
+                    time.time(),
+                ),
+            )
+
+    def find_suggestions(self, seeds: Dict[str, SeedValue]) -> List[Tuple[str, Dict[str, SeedValue]]]:
+        """Returns the source text and translations of the entries whose source text is the same or close to the seeds'."""
+        source_text = get_source_text(seeds)
+        if not source_text:
+            return []
+
+        source_texts = [row[0] for row in self.connection.execute("SELECT DISTINCT source_text FROM translations")]
+        close_texts = difflib.get_close_matches(source_text, source_texts, n=max_suggestions, cutoff=suggestion_cutoff)
+
+        suggestions = []
+        for close_text in close_texts:
+            # The most recent approval of a text is the most relevant one
+            row = self.connection.execute(
+                "SELECT translations FROM translations WHERE source_text = ? ORDER BY created_at DESC LIMIT 1",
+                (close_text,),
+            ).fetchone()
+            suggestions.append((close_text, json.loads(row[0])))
+
+        return suggestions
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_source_text(seeds: Dict[str, SeedValue]) -> str:
+    """Text that identifies what is translated: the english seed when there is one, the `other` form for plurals."""
+    if not seeds:
+        return ""
+
+    value = seeds.get("en", next(iter(seeds.values())))
+    if isinstance(value, dict):
+        value = value.get("other") or next(iter(value.values()), "")
+    return _normalize(value)
+
+
+def _compute_cache_key(seeds: Dict[str, SeedValue], target_languages: List[str], context: Optional[str]) -> str:
+    normalized_seeds = {
+        lang: {quantity: _normalize(text) for quantity, text in value.items()} if isinstance(value, dict) else _normalize(value)
+        for lang, value in seeds.items()
+    }
+    context_hash = hashlib.sha256(_normalize(context or "").encode("utf-8")).hexdigest()
+
+    key = json.dumps([normalized_seeds, sorted(target_languages), PROMPT_VERSION, context_hash], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
@@ -1,31 +1,89 @@
 """Upload translations to the backend.
 
-The backend API only accepts a single key per call, so this module exposes:
+Loco imports whole documents, so every key to upload is grouped into one
+document per locale (JSON for singular keys, Android XML for plural keys)
+and the documents are sent concurrently:
 
-  * `upload_key`            — the primitive that uploads exactly one key.
-  * `upload_translations`   — the orchestrator that, given a base key and a
-                              `Translations` object, derives the concrete keys
-                              (one per quantity in plural mode, just the base
-                              key in singular mode) and calls `upload_key` for
-                              each of them.
+  * `upload_translations_batch` — uploads many keys at once, with one
+                                  import request per locale and kind.
+  * `upload_translations`       — uploads the translations of a single base
+                                  key (all its quantities in plural mode).
+  * `upload_key`                — uploads exactly one singular key.
+
+Requests go through a pooled session and are retried with an exponential
+backoff when Loco throttles them (429), fails (5xx) or can't be reached.
+
+Existence checks are answered from a local index of the asset ids of the Loco
+project, trusted for `asset_index_max_age` after it was listed. Listing every
+asset is slow, so only batches (see `find_present_keys`) list them again once
+the index is outdated. A single key is asked to Loco on its own instead, and
+the check for similar keys is skipped.
 
 """
+import difflib
+import threading
+import time
 import xml.etree.ElementTree as ET
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set, Tuple
 
 import requests
 
+from loco_cache import LocoAssetIndex
 from translate.translation import Translations
 
 _LOCO_IMPORT_URL = "https://localise.biz/api/import/json"
+_LOCO_XML_IMPORT_URL = "https://localise.biz/api/import/xml"
 _LOCO_ASSETS_URL = "https://localise.biz/api/assets"
 
+# Seconds after which the assets are listed again, to see the keys other people created in the meantime
+asset_index_max_age = 10 * 60
+
+# Maximum amount of import requests sent at the same time, also the size of the connection pool
+max_concurrent_uploads = 8
+upload_timeout = 30  # Seconds
+max_upload_attempts = 4  # Retries wait 1, 2 then 4 seconds, unless Loco asks for longer with Retry-After
+
+_RETRIED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
 
 def is_key_already_present(key: str, loco_api_key) -> bool:
     """
     Returns True if the localisation key exists in on the remote, otherwise returns False.
     """
+    asset_index = LocoAssetIndex(loco_api_key)
+    if not asset_index.is_older_than(asset_index_max_age):
+        return key in asset_index.asset_ids
+
+    return _is_asset_present_on_remote(key, loco_api_key)
+
+
+def find_present_keys(keys: Iterable[str], loco_api_key: str) -> Set[str]:
+    """Returns the keys that already exist on the remote, listing the assets again if the index is outdated."""
+    asset_index = LocoAssetIndex(loco_api_key)
+    if asset_index.is_older_than(asset_index_max_age):
+        asset_index.replace(_list_asset_ids(loco_api_key))
+
+    return set(keys) & asset_index.asset_ids
+
+
+def find_similar_keys(key: str, loco_api_key: str) -> List[str]:
+    """
+    Returns existing keys whose name is close to `key`, most similar first, to spot duplicates before translating.
+
+    Nothing is returned when the index is outdated, listing every asset only for this warning isn't worth the wait.
+    """
+    asset_index = LocoAssetIndex(loco_api_key)
+    if asset_index.is_older_than(asset_index_max_age):
+        return []
 
+    return difflib.get_close_matches(key, asset_index.asset_ids, n=3, cutoff=0.85)
+
+
+def _is_asset_present_on_remote(key: str, loco_api_key: str) -> bool:
     url = f"{_LOCO_ASSETS_URL}/{key}"
     headers = {
         "Authorization": f"Loco {loco_api_key}",
@@ -49,121 +107,178 @@ def is_key_already_present(key: str, loco_api_key) -> bool:
     return False
 
 
+def _list_asset_ids(loco_api_key: str) -> List[str]:
+    headers = {
+        "Authorization": f"Loco {loco_api_key}",
+    }
+
+    try:
+        response = requests.get(_LOCO_ASSETS_URL, headers=headers, timeout=30)
+
+        # Raise unexpected API errors
+        response.raise_for_status()
+
+        return [asset["id"] for asset in response.json()]
+
+    except (requests.RequestException, ValueError, KeyError, TypeError) as exception:
+        raise RuntimeError(f"Failed to list existing keys: {exception}") from exception
+
+
 def upload_key(key: str, translations_per_language: Dict[str, str], tags: List[str], loco_api_key: str) -> None:
     """Upload exactly one key with one value per language.
 
     `translations_per_language` maps language code -> translated value.
     `tags` is the list of tags to attach on the backend.
     """
-    tags_param = ",".join(tags) if tags else None
-
-    for lang, value in translations_per_language.items():
-        params = {
-            "key": loco_api_key,
-            "locale": lang,
-        }
-        if tags_param:
-            params["tag-new"] = tags_param
-            params["tag-existing"] = tags_param
-
-        response = requests.post(
-            _LOCO_IMPORT_URL,
-            params=params,
-            json={key: value},
-        )
-
-        if not response.ok:
-            if response.status_code == 403:
-                print("Your loco api key doesn't have write permissions")
-                raise SystemExit(1)
-            else:
-                raise RuntimeError(
-                    f"Failed to upload key '{key}' for locale '{lang}': "
-                    f"{response.status_code} {response.reason}"
-                )
+    documents = {lang: {key: value} for lang, value in translations_per_language.items()}
+    _send_documents([(_LOCO_IMPORT_URL, "json", lang, document) for lang, document in documents.items()], tags, loco_api_key)
 
 
 def upload_translations(base_key: str, translations: Translations, tags: List[str], loco_api_key: str) -> None:
     """Orchestrate the upload of a `Translations` object as one or more keys.
 
-    In singular mode this calls `upload_key` once with `base_key`.
-    In plural mode this derives `<base_key>-<quantity>` for every quantity
-    defined for at least one language in `translations` and calls `upload_key`
-    once per derived key, passing the per-language value for that quantity.
+    In singular mode the key is uploaded with one JSON import per language.
+    In plural mode every quantity defined for a language is sent together in
+    one Android XML import per language.
+    """
+    upload_translations_batch({base_key: translations}, tags, loco_api_key)
+
+
+def upload_translations_batch(translations_per_key: Dict[str, Translations], tags: List[str], loco_api_key: str) -> None:
+    """Upload many keys with at most two import requests per language.
+
+    Singular keys of a language are merged into one JSON document and plural
+    keys into one Android XML document, so the amount of requests depends on
+    the amount of languages rather than on the amount of keys.
     """
-    if not translations.entries:
+    if not translations_per_key or any(not translations.entries for translations in translations_per_key.values()):
         raise ValueError("No translations to upload.")
 
-    if translations.is_plural():
-        _upload_plural_key(base_key, tags, translations, loco_api_key)
-    else:
-        _upload_plain_key(base_key, tags, translations, loco_api_key)
+    singular_documents: Dict[str, Dict[str, str]] = {}
+    plural_documents: Dict[str, Dict[str, Dict[str, str]]] = {}
+
+    for key, translations in translations_per_key.items():
+        for lang, entry in translations.entries.items():
+            if entry.is_plural():
+                plural_documents.setdefault(lang, {})[key] = entry.plurals
+            else:
+                singular_documents.setdefault(lang, {})[key] = entry.singular
+
+    imports = [(_LOCO_IMPORT_URL, "json", lang, document) for lang, document in singular_documents.items()]
+    imports += [(_LOCO_XML_IMPORT_URL, "xml", lang, _build_android_xml(plurals)) for lang, plurals in plural_documents.items()]
+    _send_documents(imports, tags, loco_api_key)
+
+    # Keeps the index up to date without listing every asset again
+    LocoAssetIndex(loco_api_key).add(translations_per_key.keys())
 
 
-def _build_android_xml(base_key: str, plurals: Dict[str, str]) -> bytes:
+def _build_android_xml(plurals_per_key: Dict[str, Dict[str, str]]) -> bytes:
     """
     Build Android strings XML in memory with plurals.
-    Produces a valid <resources> document containing a single <plurals> element
-    with one <item> per quantity form.
+    Produces a valid <resources> document containing one <plurals> element
+    per key with one <item> per quantity form.
 
-    `plurals` maps quantity (e.g. "one", "other", "few") to the translated string.
+    `plurals_per_key` maps each key to its quantities (e.g. "one", "other",
+    "few") mapped to the translated string.
     """
 
     resources = ET.Element("resources")
-    plurals_elem = ET.SubElement(resources, "plurals")
-    plurals_elem.set("name", base_key)
+    for base_key, plurals in plurals_per_key.items():
+        plurals_elem = ET.SubElement(resources, "plurals")
+        plurals_elem.set("name", base_key)
 
-    for quantity, value in plurals.items():
-        item = ET.SubElement(plurals_elem, "item")
-        item.set("quantity", quantity)
-        item.text = value
+        for quantity, value in plurals.items():
+            item = ET.SubElement(plurals_elem, "item")
+            item.set("quantity", quantity)
+            item.text = value
 
     return ET.tostring(resources, encoding="UTF-8", xml_declaration=True)
 
 
-def _upload_plural_key(base_key: str, tags: list[str], translations: Translations, loco_api_key: str):
-    """Upload a plural key by importing one Android XML per locale.
-
-    Each locale may have a different set of quantity forms (e.g. "one"/"other"
-    for English, "one"/"few"/"many"/"other" for Polish). We build and upload a
-    complete XML per locale so all plural forms are sent together.
+def _send_documents(imports: List[Tuple[str, str, str, object]], tags: List[str], loco_api_key: str):
+    """
+    Sends every document, given with its import url, format and language, to Loco at the same time. A single pool is used
+    for all of them so no more than `max_concurrent_uploads` requests, the size of the connection pool, are ever in flight.
     """
+    if not imports:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_uploads, len(imports))) as executor:
+        futures = [
+            executor.submit(_import_document, url, document_format, lang, document, tags, loco_api_key)
+            for url, document_format, lang, document in imports
+        ]
+        for future in futures:
+            future.result()
+
+
+def _import_document(url: str, document_format: str, lang: str, document, tags: List[str], loco_api_key: str) -> None:
+    params = {
+        "locale": lang,
+    }
     tags_param = ",".join(tags) if tags else None
+    if tags_param:
+        params["tag-new"] = tags_param
+        params["tag-existing"] = tags_param
+
+    headers = {"Authorization": f"Loco {loco_api_key}"}
+    if document_format == "xml":
+        request_body = {"data": document}
+        params["index"] = "id"
+        headers["Content-Type"] = "application/xml"
+    else:
+        request_body = {"json": document}
 
-    for lang, entry in translations.entries.items():
-        if not entry.plurals:
-            continue
-
-        xml_bytes = _build_android_xml(base_key, entry.plurals)
-
-        params = {
-            "locale": lang,
-            "index": "id",
-        }
-        if tags_param:
-            params["tag-new"] = tags_param
-            params["tag-existing"] = tags_param
-
-        response = requests.post(
-            "https://localise.biz/api/import/xml",
-            params=params,
-            headers={
-                "Authorization": f"Loco {loco_api_key}",
-                "Content-Type": "application/xml",
-            },
-            data=xml_bytes,
+    response = _post_with_retry(url, params=params, headers=headers, **request_body)
+
+    if not response.ok:
+        if response.status_code == 403:
+            print("Your loco api key doesn't have write permissions")
+            raise SystemExit(1)
+        raise RuntimeError(
+            f"Failed to import keys {', '.join(_get_document_keys(document_format, document))} for locale '{lang}': "
+            f"{response.status_code} {response.text}"
         )
 
-        if not response.ok:
-            if response.status_code == 403:
-                print("Your loco api key doesn't have write permissions")
-                raise SystemExit(1)
-            raise RuntimeError(
-                f"Failed to import plural key '{base_key}' for locale '{lang}': "
-                f"{response.status_code} {response.text}"
-            )
 
+def _get_document_keys(document_format: str, document) -> List[str]:
+    if document_format == "xml":
+        return [elem.get("name") for elem in ET.fromstring(document)]
+    return list(document.keys())
+
+
+def _post_with_retry(url: str, **kwargs) -> requests.Response:
+    """POSTs over the shared session, retrying throttled, failed and timed out requests with an exponential backoff."""
+    for attempt in range(max_upload_attempts):
+        is_last_attempt = attempt == max_upload_attempts - 1
+        delay = 2 ** attempt
+
+        try:
+            response = _get_session().post(url, timeout=upload_timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exception:
+            if is_last_attempt:
+                raise RuntimeError(f"Failed to reach Loco: {exception}") from exception
+        else:
+            if response.status_code not in _RETRIED_STATUS_CODES or is_last_attempt:
+                return response
+            delay = max(delay, _get_retry_after(response))
 
-def _upload_plain_key(base_key: str, tags: list[str], translations: Translations, loco_api_key: str):
-    per_language = {lang: entry.singular for lang, entry in translations.entries.items()}
-    upload_key(base_key, per_language, tags, loco_api_key)
+        time.sleep(delay)
+
+
+def _get_retry_after(response: requests.Response) -> int:
+    try:
+        return int(response.headers.get("Retry-After", 0))
+    except ValueError:  # Retry-After can also be an http date, the backoff is used then
+        return 0
+
+
+def _get_session() -> requests.Session:
+    """Returns the session shared by every upload so connections to Loco are reused."""
+    global _http_session
+    with _http_session_lock:  # Uploads run in several threads, they must not each create a session
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent_uploads)
+            _http_session.mount("https://", adapter)
+    return _http_session
@@ -1,6 +1,8 @@
 import os.path
 import random
+import re
 import subprocess
+import sys
 from datetime import datetime
 
 from print_utils import rainbow_print, color, Colors
@@ -10,6 +12,13 @@ cache_file = ink_folder + "/updater_cache"
 
 update_cmd = "update"
 
+# Argument given to this file when it's run in the background to fetch the latest version
+refresh_cache_arg = "--refresh-cache"
+
+_branch_section_pattern = re.compile(r'^\s*\[branch "(?P<branch>.+)"\]\s*$')
+_section_pattern = re.compile(r"^\s*\[")
+_option_pattern = re.compile(r"^\s*(?P<key>[A-Za-z0-9-]+)\s*=\s*(?P<value>.*?)\s*$")
+
 
 def run_git_local_cmd(cmd):
     out = subprocess.run(cmd, stdout=subprocess.PIPE, shell=True, universal_newlines=True, cwd=ink_folder)
@@ -17,27 +26,138 @@ def run_git_local_cmd(cmd):
 
 
 def does_current_branch_target_main():
-    return run_git_local_cmd("git rev-parse --abbrev-ref HEAD@{upstream}").startswith("origin/main")
+    branch = get_current_branch()
+    if branch is None:
+        return False
+
+    upstream = read_branch_upstream(branch)
+    return upstream == ("origin", "refs/heads/main")
+
+
+def get_current_branch():
+    """Returns the name of the checked out branch, or None if the head is detached or ink is not a git repository"""
+    head = read_git_file(get_git_folder(), "HEAD")
+    if head is None or not head.startswith("ref: refs/heads/"):
+        return None
+
+    return head[len("ref: refs/heads/"):]
 
 
 def get_current_branch_hash():
-    return run_git_local_cmd("git rev-parse HEAD").strip()
+    head = read_git_file(get_git_folder(), "HEAD")
+    if head is None or not head.startswith("ref: "):
+        return head  # Detached head
+
+    return resolve_ref(head[len("ref: "):])
+
+
+def read_branch_upstream(branch):
+    """Returns the remote and the remote ref tracked by the branch according to git's config, like `git rev-parse @{u}`"""
+    config_content = read_git_file(get_git_common_folder(), "config")
+    if config_content is None:
+        return None
+
+    remote, merge = None, None
+    is_in_branch_section = False
+    for line in config_content.splitlines():
+        section = _branch_section_pattern.match(line)
+        if section is not None:
+            is_in_branch_section = section.group("branch") == branch
+            continue
+        if _section_pattern.match(line):
+            is_in_branch_section = False
+            continue
+
+        option = _option_pattern.match(line) if is_in_branch_section else None
+        if option is not None:
+            if option.group("key").lower() == "remote":
+                remote = option.group("value")
+            elif option.group("key").lower() == "merge":
+                merge = option.group("value")
+
+    return remote, merge
+
+
+def resolve_ref(ref):
+    """Returns the hash a ref points to, reading loose refs first then packed ones, the way git does"""
+    common_folder = get_git_common_folder()
+    ref_hash = read_git_file(common_folder, ref)
+    if ref_hash is not None:
+        return ref_hash
+
+    packed_refs = read_git_file(common_folder, "packed-refs") or ""
+    for line in packed_refs.splitlines():
+        if line.startswith("#") or line.startswith("^"):
+            continue
+
+        ref_hash, _, packed_ref = line.partition(" ")
+        if packed_ref == ref:
+            return ref_hash
+
+    return None
+
+
+def get_git_folder():
+    """
+    Returns the folder of ink's repository holding its HEAD. `.git` is a file pointing to it when ink is a worktree or a
+    submodule.
+    """
+    git_path = ink_folder + "/.git"
+    if os.path.isfile(git_path):
+        git_file = read_git_file(ink_folder, ".git") or ""
+        if git_file.startswith("gitdir: "):
+            return os.path.join(ink_folder, git_file[len("gitdir: "):])
+
+    return git_path
+
+
+def get_git_common_folder():
+    """Returns the folder holding the refs and config of ink's repository, shared by all of its worktrees"""
+    git_folder = get_git_folder()
+    common_folder = read_git_file(git_folder, "commondir")
+    return git_folder if common_folder is None else os.path.join(git_folder, common_folder)
+
+
+def read_git_file(folder, name):
+    try:
+        with open(os.path.join(folder, name), "r") as fd:
+            return fd.read().strip()
+    except OSError:
+        return None
+
+
+def refresh_remote_main_hash():
+    """Fetches the latest version of main and caches its hash. Meant to be run in the background, see `check_for_updates`"""
+    # Nobody can answer a prompt in the background, so fetches needing credentials fail instead of hanging
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    fetch = subprocess.run(["git", "fetch", "--quiet"], cwd=ink_folder, env=env, stdin=subprocess.DEVNULL,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if fetch.returncode != 0:
+        return
 
+    remote_hash = resolve_ref("refs/remotes/origin/main")
+    if remote_hash:
+        cache_remote_hash(remote_hash)
 
-def get_remote_main_hash():
-    remote_hash = run_git_local_cmd("git fetch && git rev-parse origin/main").strip()
-    cache_remote_hash(remote_hash)
-    return remote_hash
+
+def start_remote_main_hash_refresh():
+    # Today's check is marked as done right away, so the commands run while fetching don't start their own fetch
+    cache_remote_hash(read_cached_remote_hash())
+
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), refresh_cache_arg], cwd=ink_folder,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
 
 
 def is_cache_outdated():
+    """Only the date of the last check matters, the hash is missing until a fetch of main succeeds"""
     if not os.path.isfile(cache_file):
         return True
 
     with open(cache_file, "r") as fd:
         lines = fd.readlines()
 
-    if len(lines) < 2:
+    if not lines:
         return True
 
     date = lines[0].strip()
@@ -47,10 +167,14 @@ def is_cache_outdated():
 
 
 def read_cached_remote_hash():
+    """Returns the hash of main when it was last fetched, or an empty string if it never was"""
+    if not os.path.isfile(cache_file):
+        return ""
+
     with open(cache_file, "r") as fd:
         lines = fd.readlines()
 
-    return lines[1].strip()
+    return lines[1].strip() if len(lines) >= 2 else ""
 
 
 def cache_remote_hash(remote_hash):
@@ -62,15 +186,15 @@ def check_for_updates(raw_args):
     if raw_args == update_cmd:  # Do not check if there's an available update when the user is explicitly asking to update
         return
 
+    # Only files are read here, the fetch runs in the background and its result is shown by the next commands
     if does_current_branch_target_main():
         if is_cache_outdated():
-            latest_hash = get_remote_main_hash()
-        else:
-            latest_hash = read_cached_remote_hash()
+            start_remote_main_hash_refresh()
 
+        latest_hash = read_cached_remote_hash()
         current_hash = get_current_branch_hash()
 
-        if current_hash != latest_hash:
+        if latest_hash and current_hash != latest_hash:
             if random.randint(0, 15) == 0:
                 rainbow_print("A new version of Ink is available!\n")
             else:
@@ -87,3 +211,7 @@ def update_git_project():
 
 def rm_cache():
     os.remove(cache_file)
+
+
+if __name__ == "__main__" and sys.argv[1:] == [refresh_cache_arg]:
+    refresh_remote_main_hash()
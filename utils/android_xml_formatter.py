@@ -3,82 +3,89 @@ Android XML strings formatting utilities.
 Provides indentation and blank line preservation for Android strings.xml files.
 """
 
-from dataclasses import dataclass
+import io
+import xml.etree.ElementTree as ET
+
+indent_unit = "    "
 
 
 def indent_android_strings_xml(root_elem):
     """
-    Format Android strings.xml with preserved blank lines.
+    Format Android strings.xml with preserved blank lines, in a single walk of the tree.
 
     Args:
         root_elem: Root Element of the XML tree
     """
-    context = _remember_blank_lines(root_elem)
-    _apply_standard_indent(root_elem)
-    _apply_blank_lines(root_elem, context)
+    # Blank lines are remembered per key name, before any tail gets replaced by the indentation
+    element_names_with_blank_after = {
+        elem.get('name') for elem in root_elem if elem.get('name') and '\n\n' in (elem.tail or '')
+    }
+    has_leading_blank_line = (root_elem.text or '').count('\n') > 1
+
+    _indent(root_elem, 0, element_names_with_blank_after)
 
+    if has_leading_blank_line:
+        current_text = root_elem.text or ''
+        if not current_text.endswith('\n\n'):
+            root_elem.text = current_text.rstrip() + '\n\n' + indent_unit
 
-def _remember_blank_lines(root):
-    """Extract blank line formatting from XML tree."""
-    element_names = set()
-    has_leading = False
-    root_text = root.text or ''
 
-    if root_text.count('\n') > 1:
-        has_leading = True
+def write_android_strings_xml(root_elem, output_xml_path, header=None):
+    """
+    Formats the tree and writes it to the strings.xml file.
 
-    for elem in root:
-        tail = elem.tail or ''
-        if '\n\n' in tail:
-            name = elem.get('name')
-            if name:
-                element_names.add(name)
+    ElementTree writes straight to the file, which is faster than building the whole content in memory first.
 
-    return BlankLineContext(
-        element_names_with_blank_after=element_names,
-        has_leading_blank_line=has_leading
-    )
+    Args:
+        root_elem: Root Element of the XML tree
+        output_xml_path: Path of the strings.xml to write
+        header: Text written before the `<resources>` tag (xml declaration, license comment, ...), if any
+    """
+    with open(output_xml_path, "wb") as f:
+        _write_android_strings_xml(root_elem, f, header)
 
 
-def _apply_standard_indent(root_elem, level=0):
-    """Standard XML indentation without blank lines."""
-    i = "\n" + level * "    "
+def serialize_android_strings_xml(root_elem, header=None):
+    """
+    Formats the tree and returns the whole content of the strings.xml, exactly as `write_android_strings_xml` writes it.
 
-    if len(root_elem):
-        if not root_elem.text or not root_elem.text.strip():
-            root_elem.text = i + "    "
+    Args:
+        root_elem: Root Element of the XML tree
+        header: Text written before the `<resources>` tag (xml declaration, license comment, ...), if any
+    """
+    stream = io.BytesIO()
+    _write_android_strings_xml(root_elem, stream, header)
+    return stream.getvalue()
 
-        for elem in root_elem:
-            _apply_standard_indent(elem, level + 1)
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
 
-    if level and (not root_elem.tail or not root_elem.tail.strip()):
-        root_elem.tail = i
+def _write_android_strings_xml(root_elem, stream, header):
+    indent_android_strings_xml(root_elem)
 
+    # The tail of the root is written after the closing tag, it gives the file its last line break
+    if not (root_elem.tail or '').endswith('\n'):
+        root_elem.tail = (root_elem.tail or '') + '\n'
 
-def _apply_blank_lines(root, context, level=0):
-    """Apply preserved blank line formatting to XML tree."""
-    indent_str = (level + 1) * "    "
+    if header is not None:
+        stream.write(header.encode("utf-8") + b'\n')
+    ET.ElementTree(root_elem).write(stream, encoding="utf-8")
 
-    if level == 0 and context.has_leading_blank_line:
-        current_text = root.text or ''
-        if not current_text.endswith('\n\n'):
-            root.text = current_text.rstrip() + '\n\n' + "    "
 
-    for elem in root:
-        name = elem.get('name')
-        if name and name in context.element_names_with_blank_after:
-            current_tail = elem.tail or ''
-            if not current_tail.endswith('\n\n'):
-                elem.tail = current_tail.rstrip() + '\n\n' + indent_str
+def _indent(elem, level, element_names_with_blank_after):
+    """Indents the children of the element with 4 spaces per level, adding the remembered blank lines after them."""
+    indent = "\n" + level * indent_unit
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = indent + indent_unit
 
-        if len(elem) > 0:
-            _apply_blank_lines(elem, context, level + 1)
+        last_child = elem[-1]
+        for child in elem:
+            _indent(child, level + 1, element_names_with_blank_after)
 
+            # The last child is followed by the closing tag of its parent so it's indented to the parent's level
+            tail_indent = indent if child is last_child else indent + indent_unit
+            if not child.tail or not child.tail.strip():
+                child.tail = tail_indent
 
-@dataclass
-class BlankLineContext:
-    """Holds information about blank line formatting in an XML file."""
-    element_names_with_blank_after: set
-    has_leading_blank_line: bool
+            name = child.get('name')
+            if name and name in element_names_with_blank_after and not child.tail.endswith('\n\n'):
+                child.tail = child.tail.rstrip() + '\n' + tail_indent